@@ -1,5 +1,11 @@
+import re
+
+from django import forms
 from django.contrib import admin
-from .models import Follow, Notification, PersonalMessage, University, Campus, Course, Material, Event, Blog, UserProfile, Community, Group, UserGroup, RequestEvent, Message, Leaders, Product
+from django.contrib.auth.models import User
+from django.db.models import Q
+from .models import Notification, OutgoingEmail, PersonalMessage, PushEvent, University, Campus, Course, Material, Event, Blog, UserProfile, Community, Group, UserGroup, RequestEvent, Message, Leaders, Product
+from .notifications import deliver
 
 # Customize how University is displayed in admin
 @admin.register(University)
@@ -65,7 +71,7 @@ class GroupAdmin(admin.ModelAdmin):
 
 @admin.register(UserGroup)
 class UserGroupAdmin(admin.ModelAdmin):
-    list_display = ('user', 'group', 'is_admin')
+    list_display = ('user', 'group', 'is_admin', 'created_at')
     list_filter = ('group',)
     search_fields = ('user__username',)
     
@@ -84,19 +90,69 @@ class UniversityLeaders(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('user','material_type', 'title','feature1', 'feature2', 'feature3', 'feature4', 'warranty', 'price', 'image1', 'image2', 'image3', 'image4')  # Show material type and associated fields
-    search_fields = ('material_type', 'user')  # Search for materials
+    search_fields = ('title', 'feature1', 'feature2', 'feature3', 'feature4', 'material_type', 'user__username')  # Search for products
     list_filter = ('material_type', 'user')  # Filters
     
-@admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
-    list_display = ('user','group', 'created_at')  # Show material type and associated fields
-    search_fields = ('user', 'group')  # Search for materials
-    list_filter = ('group', 'created_at')  # Filters
-
 @admin.register(PersonalMessage)
 class PersonalMessages(admin.ModelAdmin):
     list_display = ('sender', 'recipient', 'content', 'timestamp', 'read')
     
+class NotificationForm(forms.ModelForm):
+    # Typed rather than picked from a list, which would render every user
+    recipients = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 3}), required=False,
+        help_text='Usernames or emails, separated by commas or new lines, for "Selected users".',
+    )
+
+    class Meta:
+        model = Notification
+        fields = ('title', 'content', 'audience', 'university', 'campus')
+
+    def clean_recipients(self):
+        names = set(re.split(r'[\s,]+', self.cleaned_data['recipients'].strip())) - {''}
+        user_ids, known = set(), set()
+        for user_id, username, email in (User.objects.filter(Q(username__in=names) | Q(email__in=names))
+                                         .values_list('id', 'username', 'email')):
+            user_ids.add(user_id)
+            known.update((username, email))
+        unknown = sorted(names - known)
+        if unknown:
+            raise forms.ValidationError(f'No user with username or email: {", ".join(unknown)}')
+        return sorted(user_ids)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (self.instance._state.adding and cleaned_data.get('audience') == Notification.AUDIENCE_DIRECT
+                and not cleaned_data.get('recipients') and 'recipients' not in self.errors):
+            self.add_error('recipients', 'Choose at least one user to notify.')
+        return cleaned_data
+
+
 @admin.register(Notification)
 class AdminNotification(admin.ModelAdmin):
-    list_display = ('title', 'content', 'time', 'read')
\ No newline at end of file
+    form = NotificationForm
+    list_display = ('title', 'content', 'time', 'audience', 'university', 'campus')
+    list_filter = ('audience',)
+
+    def get_fields(self, request, obj=None):
+        fields = super().get_fields(request, obj)
+        return fields if obj is None else [name for name in fields if name != 'recipients']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Counters were bumped for the original audience; changing it would skew them
+        return ('audience', 'university', 'campus') if obj is not None else ()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change and obj.audience == Notification.AUDIENCE_DIRECT:
+            deliver(obj, form.cleaned_data['recipients'])
+
+@admin.register(PushEvent)
+class AdminPushEvent(admin.ModelAdmin):
+    list_display = ('kind', 'target', 'title', 'count', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind')
+
+@admin.register(OutgoingEmail)
+class AdminOutgoingEmail(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the signal receivers (cache invalidation, counters, pushes)
+        from . import authentication, catalog, communities, groups, notifications, profiles, push, search, trending  # noqa: F401
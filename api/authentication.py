@@ -0,0 +1,147 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULT_TOKEN_AUTH_CACHE_SIZE = 10000
+DEFAULT_TOKEN_AUTH_CACHE_TTL = 60
+DEFAULT_TOKEN_AUTH_LOCAL_CACHE_TTL = 5
+SHARED_KEY_PREFIX = 'authtoken:'
+
+
+class LocalTokenCache:
+    """Process-local LRU of validated tokens with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            token, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self._lock:
+            self._entries[key] = (token, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedTokenCache:
+    """Token cache stored in one of the Django CACHES, shared by all workers."""
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(SHARED_KEY_PREFIX + key)
+
+    def set(self, key, token):
+        self.cache.set(SHARED_KEY_PREFIX + key, token, self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(SHARED_KEY_PREFIX + key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_token_cache = None
+# Backends whose entries live in the worker's own memory
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def build_token_cache():
+    """
+    The token cache for the current settings: the TOKEN_AUTH_SHARED_CACHE
+    alias if set, else the default CACHES alias when every worker shares it.
+    The process-local LRU is the last resort; a logout only evicts it in the
+    worker that served it, so its entries live just TOKEN_AUTH_LOCAL_CACHE_TTL.
+    """
+    ttl = getattr(settings, 'TOKEN_AUTH_CACHE_TTL', DEFAULT_TOKEN_AUTH_CACHE_TTL)
+    alias = getattr(settings, 'TOKEN_AUTH_SHARED_CACHE', None)
+    if alias is None and settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        alias = 'default'
+    if alias:
+        return SharedTokenCache(alias, ttl)
+    size = getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', DEFAULT_TOKEN_AUTH_CACHE_SIZE)
+    local_ttl = min(ttl, getattr(settings, 'TOKEN_AUTH_LOCAL_CACHE_TTL', DEFAULT_TOKEN_AUTH_LOCAL_CACHE_TTL))
+    return LocalTokenCache(size, local_ttl)
+
+
+def get_token_cache():
+    """Return the process-wide token cache, built on first use."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = build_token_cache()
+    return _token_cache
+
+
+def invalidate_token(key):
+    get_token_cache().delete(key)
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that skips the Token + User query for recently
+    validated tokens. Entries are dropped when the token is deleted or its
+    user is saved (logout, password reset, deactivation).
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        token = cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(key, token)
+        # Copies, so per-request changes never leak into the cached objects
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return (token.user, token)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
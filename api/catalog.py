@@ -0,0 +1,153 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Campus, Course, University
+
+# Upper bound on how stale another worker's snapshot can get; saves in this
+# process invalidate it immediately through the signals below.
+DEFAULT_CATALOG_SNAPSHOT_TTL = 300
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the university -> campus -> course catalog, built with
+    three flat queries. `version` is a content hash usable as an ETag.
+    """
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        universities = list(University.objects.order_by('id').values('id', 'name'))
+        campuses = list(Campus.objects.order_by('id').values('id', 'university_id', 'name'))
+        courses = list(Course.objects.order_by('id').values('id', 'university_id', 'campus_id', 'name'))
+
+        university_names = {u['id']: u['name'] for u in universities}
+        campus_names = {c['id']: c['name'] for c in campuses}
+
+        # Flat lists in the shape the existing list endpoints return
+        self.universities = universities
+        self.campuses = [
+            {'id': c['id'], 'university': c['university_id'], 'name': c['name']} for c in campuses
+        ]
+        self.courses = [
+            {
+                'id': c['id'],
+                'name': c['name'],
+                'university': university_names.get(c['university_id']),
+                'campus': campus_names.get(c['campus_id']),
+            }
+            for c in courses
+        ]
+        self.campuses_by_university = {}
+        for campus in self.campuses:
+            self.campuses_by_university.setdefault(campus['university'], []).append(campus)
+        self.courses_by_campus = {}
+        for course, row in zip(self.courses, courses):
+            self.courses_by_campus.setdefault(row['campus_id'], []).append(course)
+
+        self.tree = [
+            {
+                'id': university['id'],
+                'name': university['name'],
+                'campuses': [
+                    {
+                        'id': campus['id'],
+                        'name': campus['name'],
+                        'courses': [
+                            {'id': course['id'], 'name': course['name']}
+                            for course in self.courses_by_campus.get(campus['id'], [])
+                        ],
+                    }
+                    for campus in self.campuses_by_university.get(university['id'], [])
+                ],
+            }
+            for university in universities
+        ]
+        self.tree_by_university = {node['id']: node for node in self.tree}
+
+        # Name -> id lookups used by registration; the first row wins on duplicates
+        self.university_ids = {}
+        for u in universities:
+            self.university_ids.setdefault(u['name'], u['id'])
+        self.campus_ids = {}
+        for c in campuses:
+            self.campus_ids.setdefault((c['university_id'], c['name']), c['id'])
+        self.course_ids = {}
+        for c in courses:
+            self.course_ids.setdefault((c['university_id'], c['campus_id'], c['name']), c['id'])
+        self.version = hashlib.md5(json.dumps(self.tree, sort_keys=True).encode()).hexdigest()
+
+    def resolve(self, university_name, campus_name, course_name):
+        """
+        Return (university_id, campus_id, course_id) for a registration form;
+        ids are None from the first name that doesn't match onwards.
+        """
+        university_id = self.university_ids.get(university_name)
+        campus_id = self.campus_ids.get((university_id, campus_name)) if university_id else None
+        course_id = self.course_ids.get((university_id, campus_id, course_name)) if campus_id else None
+        return university_id, campus_id, course_id
+
+    def etag(self, *parts):
+        return '"{}"'.format('-'.join([self.version, *map(str, parts)]))
+
+
+def get_catalog():
+    """Return the current snapshot, rebuilding it if invalidated or expired."""
+    global _snapshot
+    ttl = getattr(settings, 'CATALOG_SNAPSHOT_TTL', DEFAULT_CATALOG_SNAPSHOT_TTL)
+    snapshot = _snapshot
+    if snapshot is None or time.monotonic() - snapshot.built_at > ttl:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or time.monotonic() - snapshot.built_at > ttl:
+                snapshot = _snapshot = CatalogSnapshot()
+    return snapshot
+
+
+def resolve_names(university_name, campus_name, course_name):
+    """
+    CatalogSnapshot.resolve() with a database fallback for names the snapshot
+    doesn't know: another worker may have added them since this process built
+    it, and its signals only invalidate its own snapshot. Finding one drops
+    the stale snapshot here too.
+    """
+    ids = get_catalog().resolve(university_name, campus_name, course_name)
+    if None not in ids:
+        return ids
+    university_id, campus_id, course_id = ids
+    if university_id is None:
+        university_id = (University.objects.filter(name=university_name).order_by('id')
+                         .values_list('id', flat=True).first())
+    if university_id is not None and campus_id is None:
+        campus_id = (Campus.objects.filter(university_id=university_id, name=campus_name).order_by('id')
+                     .values_list('id', flat=True).first())
+    if campus_id is not None and course_id is None:
+        course_id = (Course.objects.filter(university_id=university_id, campus_id=campus_id, name=course_name)
+                     .order_by('id').values_list('id', flat=True).first())
+    resolved = (university_id, campus_id, course_id)
+    if resolved != ids:
+        invalidate_catalog()
+    return resolved
+
+
+def invalidate_catalog():
+    global _snapshot
+    _snapshot = None
+
+
+@receiver([post_save, post_delete], sender=University)
+@receiver([post_save, post_delete], sender=Campus)
+@receiver([post_save, post_delete], sender=Course)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+    # Again after commit, in case another request rebuilt it from the old rows meanwhile
+    transaction.on_commit(invalidate_catalog)
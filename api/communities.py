@@ -0,0 +1,103 @@
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Community, Group, UserGroup
+
+
+def group_count_subquery():
+    return Coalesce(Subquery(
+        Group.objects.filter(community_id=OuterRef('pk')).order_by()
+        .values('community_id').annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def follower_count_subquery():
+    return Coalesce(Subquery(
+        UserGroup.objects.filter(group__community_id=OuterRef('pk')).order_by()
+        .values('group__community_id').annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def annotate_community_counts(communities):
+    """Annotate num_groups and num_followers, counted for just the rows fetched."""
+    return communities.annotate(num_groups=group_count_subquery(), num_followers=follower_count_subquery())
+
+
+def recount_communities(communities=None):
+    """Reset the stored counters from the group and membership tables."""
+    communities = Community.objects.all() if communities is None else communities
+    return communities.update(group_count=group_count_subquery(), follower_count=follower_count_subquery())
+
+
+def _adjust(communities, field, delta):
+    """
+    Add delta to a counter, clamped at zero. The CASE keeps MySQL from ever
+    computing 0 - 1 on the unsigned column, which is an error there (1690).
+    """
+    if delta >= 0:
+        value = F(field) + delta
+    else:
+        value = Case(When(**{f'{field}__gte': -delta}, then=F(field) + delta), default=Value(0))
+    communities.update(**{field: value})
+
+
+def _adjust_followers(group_id, delta):
+    community = Group.objects.filter(pk=group_id).values('community_id')[:1]
+    _adjust(Community.objects.filter(pk=Subquery(community)), 'follower_count', delta)
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    # Only a save that moves the group to another community changes counters
+    instance._moved_from_community = None
+    if not instance._state.adding and instance.pk:
+        previous = Group.objects.filter(pk=instance.pk).values_list('community_id', flat=True).first()
+        if previous is not None and previous != instance.community_id:
+            instance._moved_from_community = previous
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        _adjust(Community.objects.filter(pk=instance.community_id), 'group_count', 1)
+        return
+    previous = getattr(instance, '_moved_from_community', None)
+    if previous is None:
+        return
+    instance._moved_from_community = None
+    followers = UserGroup.objects.filter(group=instance).count()
+    _adjust(Community.objects.filter(pk=previous), 'group_count', -1)
+    _adjust(Community.objects.filter(pk=previous), 'follower_count', -followers)
+    _adjust(Community.objects.filter(pk=instance.community_id), 'group_count', 1)
+    _adjust(Community.objects.filter(pk=instance.community_id), 'follower_count', followers)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # Its memberships were deleted first and took themselves off follower_count
+    _adjust(Community.objects.filter(pk=instance.community_id), 'group_count', -1)
+
+
+@receiver(post_save, sender=UserGroup)
+def membership_created(sender, instance, created, **kwargs):
+    if created:
+        _adjust_followers(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=UserGroup)
+def membership_deleted(sender, instance, **kwargs):
+    _adjust_followers(instance.group_id, -1)
+
+
+@receiver(m2m_changed, sender=UserGroup)
+def followers_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # followers.add() bulk-inserts without post_save; removals go through post_delete
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for group_id in pk_set:
+            _adjust_followers(group_id, 1)
+    else:
+        _adjust_followers(instance.pk, len(pk_set))
@@ -0,0 +1,35 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import Group, Message, UserGroup
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Point the group back at its newest remaining message when the one it
+    showed is deleted (SET_NULL has already cleared last_message by now).
+    """
+    if not instance.group_id or (isinstance(origin, Group) and origin.pk == instance.group_id):
+        return
+    newest = (Message.objects.filter(group_id=instance.group_id).order_by('-timestamp', '-id')
+              .values_list('id', 'timestamp').first() or (None, None))
+    Group.objects.filter(pk=instance.group_id, last_message__isnull=True).update(
+        last_message_id=newest[0], last_message_at=newest[1]
+    )
+
+
+@receiver(m2m_changed, sender=UserGroup)
+def followers_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # followers.add() bulk-inserts without UserGroup.save, so new members'
+    # read_seq is set here the same way: the group's history already read
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        added = UserGroup.objects.filter(user=instance, group_id__in=pk_set)
+    else:
+        added = UserGroup.objects.filter(group=instance, user_id__in=pk_set)
+    added.filter(read_seq=0).update(
+        read_seq=Subquery(Group.objects.filter(pk=OuterRef('group_id')).values('message_seq')[:1])
+    )
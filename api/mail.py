@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+DEFAULT_EMAIL_OUTBOX_BATCH_SIZE = 50
+DEFAULT_EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+DEFAULT_EMAIL_OUTBOX_RETRY_DELAY = 30  # seconds, doubled after every failure
+DEFAULT_EMAIL_OUTBOX_CLAIM_TIMEOUT = 300  # seconds before a claimed batch is retried
+DEFAULT_EMAIL_OUTBOX_SENT_RETENTION_HOURS = 24
+PURGE_CHUNK_SIZE = 5000
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """
+    Queue an email for the outbox worker instead of talking to SMTP inline.
+    The row is part of the caller's transaction, so nothing is sent for a
+    request that rolls back.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject, body=message, from_email=from_email, recipients=list(recipient_list)
+    )
+
+
+def _record_failure(email, exc, max_attempts, retry_delay):
+    email.attempts += 1
+    email.last_error = str(exc)
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.STATUS_FAILED
+        email.body = ''
+    else:
+        email.status = OutgoingEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+
+
+def _claim_batch(batch_size, claim_timeout):
+    """
+    Mark a batch of due mail as sending and commit, so SMTP is spoken without
+    holding row locks. A claim left by a worker that died is picked up again
+    once it lapses.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers drain the outbox side by side
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutgoingEmail.STATUS_PENDING, OutgoingEmail.STATUS_SENDING],
+                    next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for email in batch:
+            email.status = OutgoingEmail.STATUS_SENDING
+            email.next_attempt_at = now + timedelta(seconds=claim_timeout)
+        OutgoingEmail.objects.bulk_update(batch, ['status', 'next_attempt_at'])
+    return batch
+
+
+def send_queued_mail(batch_size=None):
+    """
+    Send one batch of due outbox rows over a single SMTP connection, scheduling
+    failures for retry with exponential backoff. Bodies are cleared once sent.
+    Returns (sent, failed).
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_EMAIL_OUTBOX_BATCH_SIZE)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_EMAIL_OUTBOX_MAX_ATTEMPTS)
+    retry_delay = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', DEFAULT_EMAIL_OUTBOX_RETRY_DELAY)
+    claim_timeout = getattr(settings, 'EMAIL_OUTBOX_CLAIM_TIMEOUT', DEFAULT_EMAIL_OUTBOX_CLAIM_TIMEOUT)
+
+    batch = _claim_batch(batch_size, claim_timeout)
+    if not batch:
+        return 0, 0
+
+    delivered, failures = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # SMTP unreachable: the whole batch is retried later
+        for email in batch:
+            _record_failure(email, exc, max_attempts, retry_delay)
+        failures = batch
+    else:
+        with connection:
+            for email in batch:
+                try:
+                    EmailMessage(email.subject, email.body, email.from_email, email.recipients,
+                                 connection=connection).send()
+                except Exception as exc:
+                    _record_failure(email, exc, max_attempts, retry_delay)
+                    failures.append(email)
+                else:
+                    delivered.append(email.id)
+
+    with transaction.atomic():
+        OutgoingEmail.objects.filter(id__in=delivered).update(
+            status=OutgoingEmail.STATUS_SENT, sent_at=timezone.now(), attempts=F('attempts') + 1,
+            last_error=None, body='',
+        )
+        OutgoingEmail.objects.bulk_update(failures, ['status', 'attempts', 'next_attempt_at', 'last_error', 'body'])
+    return len(delivered), len(failures)
+
+
+def purge_sent_mail(older_than=None):
+    """Delete mail sent more than EMAIL_OUTBOX_SENT_RETENTION_HOURS ago, in chunks. Returns the number deleted."""
+    hours = getattr(settings, 'EMAIL_OUTBOX_SENT_RETENTION_HOURS', DEFAULT_EMAIL_OUTBOX_SENT_RETENTION_HOURS)
+    cutoff = older_than or timezone.now() - timedelta(hours=hours)
+    deleted = 0
+    while True:
+        ids = list(OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_SENT, sent_at__lt=cutoff)
+                   .values_list('id', flat=True)[:PURGE_CHUNK_SIZE])
+        if not ids:
+            return deleted
+        deleted += OutgoingEmail.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Blog, Event, Product
+from api.placeholders import compute_placeholder
+
+
+class Command(BaseCommand):
+    help = 'Compute image placeholders for stored Event, Blog and Product images that lack one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recompute placeholders that already exist.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, force=False, chunk_size=500, **options):
+        for model in (Event, Blog, Product):
+            updated = 0
+            fields = model.placeholder_fields
+            queryset = model.objects.only('pk', 'image_placeholders', *fields).order_by('pk')
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                placeholders = dict(obj.image_placeholders or {})
+                for name in fields:
+                    field_file = getattr(obj, name)
+                    if not field_file:
+                        placeholders.pop(name, None)
+                    elif force or name not in placeholders:
+                        placeholder = compute_placeholder(field_file)
+                        if placeholder:
+                            placeholders[name] = placeholder
+                        field_file.close()
+                if placeholders != obj.image_placeholders:
+                    # Bypass save() so nothing else about the row is touched
+                    model.objects.filter(pk=obj.pk).update(image_placeholders=placeholders)
+                    updated += 1
+            self.stdout.write(f'{model.__name__}: updated {updated} rows')
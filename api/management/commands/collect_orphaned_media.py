@@ -0,0 +1,119 @@
+import os
+import posixpath
+import shutil
+import time
+from urllib.parse import unquote, urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+
+def file_fields():
+    """Yield (model, field name) for every concrete FileField/ImageField."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+def upload_roots():
+    """Top-level directories the current upload_to settings write into, e.g. {'e-commerce', 'events'}."""
+    roots = set()
+    for model, name in file_fields():
+        upload_to = model._meta.get_field(name).upload_to
+        if isinstance(upload_to, str) and upload_to.strip('/'):
+            roots.add(upload_to.strip('/').split('/')[0])
+    return roots
+
+
+def normalize_name(value):
+    """
+    Reduce a stored file value to a name relative to the media root. Older
+    rows hold absolute URLs ('https://host/materials/blogs/a.jpg'), paths with
+    a leading slash or MEDIA_URL prefix, so all of them map to 'blogs/a.jpg'.
+    """
+    path = unquote(urlsplit(value).path) if '://' in value else value
+    media_prefix = settings.MEDIA_URL.strip('/')
+    path = path.lstrip('/')
+    if media_prefix and path.startswith(media_prefix + '/'):
+        path = path[len(media_prefix) + 1:]
+    return posixpath.normpath(path)
+
+
+def referenced_names(chunk_size):
+    """
+    Every file name any FileField/ImageField on any model refers to. One set
+    for all fields, since a file may be referenced from a field that uploads
+    elsewhere or that used a different upload_to when the row was written.
+    """
+    names = set()
+    for model, name in file_fields():
+        queryset = (model._default_manager.exclude(**{f'{name}__isnull': True}).exclude(**{name: ''})
+                    .order_by().values_list(name, flat=True))
+        names.update(normalize_name(value) for value in queryset.iterator(chunk_size=chunk_size))
+    return names
+
+
+def walk_files(path):
+    """Yield DirEntry objects for every file below path without listing it into memory."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Find media files no FileField/ImageField references any more and delete or '
+        'quarantine them. Dry run unless --delete or --quarantine is given; safe to '
+        'schedule from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete orphaned files.')
+        parser.add_argument('--quarantine', metavar='DIR', help='Move orphaned files under DIR instead of deleting.')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Leave files modified more recently than this alone (default 24).')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, delete=False, quarantine=None, grace_hours=24, chunk_size=2000, **options):
+        if delete and quarantine:
+            raise CommandError('Use either --delete or --quarantine, not both.')
+        try:
+            media_root = default_storage.path('')
+        except NotImplementedError:
+            raise CommandError('Orphan collection needs a local filesystem storage.')
+
+        cutoff = time.time() - grace_hours * 3600
+        referenced = referenced_names(chunk_size)
+        self.stdout.write(f'{len(referenced)} referenced files')
+        orphans = reclaimed = 0
+        for root in sorted(upload_roots()):
+            root_path = os.path.join(media_root, root)
+            if not os.path.isdir(root_path):
+                continue
+            for entry in walk_files(root_path):
+                name = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+                if name in referenced:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > cutoff:
+                    continue
+                orphans += 1
+                reclaimed += stat.st_size
+                if quarantine:
+                    target = os.path.join(quarantine, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(entry.path, target)
+                elif delete:
+                    os.remove(entry.path)
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+
+        action = 'Quarantined' if quarantine else 'Deleted' if delete else 'Would reclaim'
+        self.stdout.write(self.style.SUCCESS(f'{action} {orphans} orphaned files ({reclaimed} bytes).'))
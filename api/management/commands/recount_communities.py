@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.communities import recount_communities
+
+
+class Command(BaseCommand):
+    help = "Reset every community's stored group and follower counters from the group and membership tables."
+
+    def handle(self, *args, **options):
+        updated = recount_communities()
+        self.stdout.write(f'Recounted {updated} communities')
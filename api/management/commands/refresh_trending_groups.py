@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Rescore trending groups from their recent hourly activity counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing instead of exiting after one pass.')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds to sleep between refreshes with --loop.')
+
+    def handle(self, *args, loop=False, interval=300.0, **options):
+        while True:
+            ranked = refresh_trending()
+            self.stdout.write(f'Ranked {ranked} groups')
+            if not loop:
+                break
+            time.sleep(interval)
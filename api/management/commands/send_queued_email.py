@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.mail import purge_sent_mail, send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches over a reused SMTP connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, batch_size=None, loop=False, interval=2.0, **options):
+        while True:
+            sent, failed = send_queued_mail(batch_size)
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            # Outbox drained: drop old sent rows before waiting or exiting
+            purged = purge_sent_mail()
+            if purged:
+                self.stdout.write(f'Purged {purged} sent emails')
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import OTP
+
+
+class Command(BaseCommand):
+    help = 'Delete expired OTP rows in bounded chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks.')
+
+    def handle(self, *args, chunk_size=5000, pause=0.0, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Walks the expires_at index; each DELETE touches at most chunk_size rows
+            ids = list(OTP.objects.filter(expires_at__lte=now).order_by('expires_at').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted += OTP.objects.filter(id__in=ids).delete()[0]
+            if pause:
+                time.sleep(pause)
+        self.stdout.write(f'Deleted {deleted} expired OTPs')
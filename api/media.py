@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+
+
+class MediaURLBuilder:
+    """
+    Builds absolute media URLs from a base computed once per request.
+
+    If MEDIA_BASE_URL is set (e.g. a CDN host) it is used as is, otherwise the
+    base is derived from the request host/scheme and MEDIA_URL.
+    """
+
+    def __init__(self, request=None):
+        base = getattr(settings, 'MEDIA_BASE_URL', None)
+        if not base and request is not None:
+            base = request.build_absolute_uri(settings.MEDIA_URL)
+        self.base = base.rstrip('/') + '/' if base else None
+
+    def url(self, field):
+        return self.url_for_name(field.name) if field else None
+
+    def url_for_name(self, name):
+        """URL for a storage name, e.g. one read with .values() rather than a FieldFile."""
+        if not name or self.base is None:
+            return None
+        return self.base + filepath_to_uri(name).lstrip('/')
+
+
+def get_media_url_builder(request=None):
+    """Return the builder cached on the request, creating it on first use."""
+    if request is None:
+        return MediaURLBuilder()
+    http_request = getattr(request, '_request', request)
+    builder = getattr(http_request, '_media_url_builder', None)
+    if builder is None:
+        builder = MediaURLBuilder(request)
+        http_request._media_url_builder = builder
+    return builder
+
+
+class MediaURLMixin:
+    """Serializer mixin giving access to the request's media URL builder."""
+
+    def media_url(self, field):
+        return get_media_url_builder(self.context.get('request')).url(field)
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Catch-up for model changes that were made without migrations: the
+# BlogComment and BlockedUser tables, new material_type choices and
+# UserProfile.profile_picture becoming an ImageField. Nothing else depends on
+# it beyond ordering. A database where those tables were already created by
+# hand should record it with `manage.py migrate api 0037 --fake`.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_product_is_sold_alter_product_material_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='material',
+            name='material_type',
+            field=models.CharField(choices=[('past_paper', 'Past Paper'), ('notes', 'Notes'), ('test', 'Test'), ('timetable', 'Timetable'), ('report', 'Report')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='material_type',
+            field=models.CharField(choices=[('electronics', 'Electronics'), ('furniture', 'Furniture'), ('fashion', 'Fashion'), ('beauty', 'Beauty'), ('health', 'Health'), ('cosmetics', 'Cosmetics'), ('vehicles', 'Vehicles')], max_length=50),
+        ),
+        # State only: the column stays varchar(200), since shrinking it to
+        # the ImageField's 100 would truncate or reject the URLs already stored
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='userprofile',
+                    name='profile_picture',
+                    field=models.ImageField(blank=True, null=True, upload_to='profiles/'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BlogComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='api.blog')),
+                ('likes', models.ManyToManyField(blank=True, related_name='liked_comments', to=settings.AUTH_USER_MODEL)),
+                ('parent_comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='api.blogcomment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BlockedUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('blocked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_by', to=settings.AUTH_USER_MODEL)),
+                ('blocker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_users', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'unique_together': {('blocker', 'blocked')},
+            },
+        ),
+    ]
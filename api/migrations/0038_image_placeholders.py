@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_catch_up_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='image_placeholders',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='image_placeholders',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_placeholders',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
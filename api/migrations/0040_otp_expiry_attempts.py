@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:28
+
+from datetime import timedelta
+
+import api.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_expires_at(apps, schema_editor):
+    # The field default gave existing rows the migration time plus the TTL
+    OTP = apps.get_model('api', 'OTP')
+    ttl = timedelta(seconds=getattr(settings, 'OTP_TTL_SECONDS', 600))
+    OTP.objects.update(expires_at=F('created_at') + ttl)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=api.models.otp_expiry),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
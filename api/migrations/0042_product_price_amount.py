@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+from api.pricing import parse_price
+
+
+def backfill_price_amount(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    batch = []
+    for product in Product.objects.exclude(price=None).only('id', 'price').iterator(chunk_size=1000):
+        product.price_amount, product.price_currency = parse_price(product.price)
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ['price_amount', 'price_currency'])
+            batch = []
+    Product.objects.bulk_update(batch, ['price_amount', 'price_currency'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0041_product_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_currency',
+            field=models.CharField(blank=True, max_length=3, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['material_type', 'is_sold', 'price_amount'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_sold', 'price_amount'], name='product_price_idx'),
+        ),
+        migrations.RunPython(backfill_price_amount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_product_fts USING fts5("
+    "title, feature1, feature2, feature3, feature4, content='api_product', content_rowid='id')",
+    "CREATE TRIGGER api_product_fts_insert AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_fts(rowid, title, feature1, feature2, feature3, feature4) "
+    "VALUES (new.id, new.title, new.feature1, new.feature2, new.feature3, new.feature4); END",
+    "CREATE TRIGGER api_product_fts_delete AFTER DELETE ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, title, feature1, feature2, feature3, feature4) "
+    "VALUES ('delete', old.id, old.title, old.feature1, old.feature2, old.feature3, old.feature4); END",
+    "CREATE TRIGGER api_product_fts_update AFTER UPDATE ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, title, feature1, feature2, feature3, feature4) "
+    "VALUES ('delete', old.id, old.title, old.feature1, old.feature2, old.feature3, old.feature4); "
+    "INSERT INTO api_product_fts(rowid, title, feature1, feature2, feature3, feature4) "
+    "VALUES (new.id, new.title, new.feature1, new.feature2, new.feature3, new.feature4); END",
+    "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_product_fts_insert",
+    "DROP TRIGGER IF EXISTS api_product_fts_delete",
+    "DROP TRIGGER IF EXISTS api_product_fts_update",
+    "DROP TABLE IF EXISTS api_product_fts",
+]
+MYSQL_FORWARD = [
+    "ALTER TABLE api_product ADD FULLTEXT INDEX product_search_ft (title, feature1, feature2, feature3, feature4)",
+]
+MYSQL_BACKWARD = [
+    "ALTER TABLE api_product DROP INDEX product_search_ft",
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                if not cursor.fetchone()[0]:
+                    return  # No FTS5: search falls back to the in-process index
+        for statement in statements_by_vendor.get(vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Full-text index over product titles and features (FTS5 on SQLite, FULLTEXT on MySQL)."""
+
+    dependencies = [
+        ('api', '0042_product_price_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'mysql': MYSQL_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'mysql': MYSQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_existing_broadcasts(apps, schema_editor):
+    # Notifications so far went to everyone, which is what the new audience defaults to
+    Notification = apps.get_model('api', 'Notification')
+    BroadcastCounter = apps.get_model('api', 'BroadcastCounter')
+    BroadcastCounter.objects.update_or_create(key='all', defaults={'total': Notification.objects.count()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0043_product_search_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('total', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationInbox',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_inbox', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_direct', models.IntegerField(default=0)),
+                ('broadcasts_read', models.IntegerField(default=0)),
+                ('broadcasts_read_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='read',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('direct', 'Selected users'), ('all', 'Everyone'), ('university', 'University'), ('campus', 'Campus')], default='all', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='campus',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.campus'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='university',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.university'),
+        ),
+        migrations.CreateModel(
+            name='NotificationDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='api.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'notification')},
+            },
+        ),
+        migrations.RunPython(count_existing_broadcasts, migrations.RunPython.noop),
+    ]
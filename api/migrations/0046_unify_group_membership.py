@@ -0,0 +1,74 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:05
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+CHUNK_SIZE = 1000
+
+
+def merge_memberships(apps, schema_editor):
+    """
+    Fold Follow rows and the old Group.followers join table into UserGroup.
+    Existing UserGroup rows win, then Follow (which knows when the user
+    followed), then the join table.
+    """
+    UserGroup = apps.get_model('api', 'UserGroup')
+    Follow = apps.get_model('api', 'Follow')
+    Followers = apps.get_model('api', 'Group').followers.through
+
+    def copy(rows):
+        batch = []
+        for row in rows:
+            batch.append(UserGroup(**row))
+            if len(batch) >= CHUNK_SIZE:
+                UserGroup.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        UserGroup.objects.bulk_create(batch, ignore_conflicts=True)
+
+    copy(Follow.objects.values('user_id', 'group_id', 'created_at').iterator(chunk_size=CHUNK_SIZE))
+    copy(Followers.objects.values('user_id', 'group_id').iterator(chunk_size=CHUNK_SIZE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0045_pushevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usergroup',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usergroup',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='usergroup',
+            constraint=models.UniqueConstraint(fields=('group', 'user'), name='usergroup_group_user_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='usergroup',
+            index=models.Index(fields=['user', 'group'], name='usergroup_user_group_idx'),
+        ),
+        migrations.RunPython(merge_memberships, migrations.RunPython.noop),
+        # An auto-created M2M can't be altered to use a through model, so the
+        # old join table is dropped (its rows were merged above) and the field
+        # is re-added on top of UserGroup
+        migrations.RemoveField(
+            model_name='group',
+            name='followers',
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='followers',
+            field=models.ManyToManyField(blank=True, related_name='followed_groups', through='api.UserGroup', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.DeleteModel(
+            name='Follow',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def backfill_last_messages(apps, schema_editor):
+    # Existing memberships start fully read, so nobody wakes up to a backlog
+    Group = apps.get_model('api', 'Group')
+    Message = apps.get_model('api', 'Message')
+    UserGroup = apps.get_model('api', 'UserGroup')
+    stats = list(Message.objects.exclude(group=None).values('group_id').annotate(total=Count('id'), last_id=Max('id')))
+    timestamps = dict(Message.objects.filter(id__in=[row['last_id'] for row in stats]).values_list('id', 'timestamp'))
+    groups = [
+        Group(id=row['group_id'], message_seq=row['total'], last_message_id=row['last_id'],
+              last_message_at=timestamps[row['last_id']])
+        for row in stats
+    ]
+    Group.objects.bulk_update(groups, ['message_seq', 'last_message', 'last_message_at'], batch_size=1000)
+    UserGroup.objects.update(read_seq=Subquery(Group.objects.filter(pk=OuterRef('group_id')).values('message_seq')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0046_unify_group_membership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.message'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='message_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usergroup',
+            name='read_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0047_group_last_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('follows', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='api.group')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='groupactivity_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'hour'), name='groupactivity_group_hour_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingGroup',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='api.group')),
+                ('score', models.FloatField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('university', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.university')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['university', '-score'], name='trendinggroup_university_idx'), models.Index(fields=['-score'], name='trendinggroup_score_idx')],
+            },
+        ),
+    ]
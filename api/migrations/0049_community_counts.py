@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_groups_and_followers(apps, schema_editor):
+    Community = apps.get_model('api', 'Community')
+    Group = apps.get_model('api', 'Group')
+    UserGroup = apps.get_model('api', 'UserGroup')
+    groups = (Group.objects.filter(community_id=OuterRef('pk')).order_by()
+              .values('community_id').annotate(total=Count('*')).values('total'))
+    followers = (UserGroup.objects.filter(group__community_id=OuterRef('pk')).order_by()
+                 .values('group__community_id').annotate(total=Count('*')).values('total'))
+    Community.objects.update(group_count=Coalesce(Subquery(groups), 0),
+                             follower_count=Coalesce(Subquery(followers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0048_trending_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='group_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_groups_and_followers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0049_community_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pushevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
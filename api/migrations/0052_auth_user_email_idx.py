@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['email'], name='auth_user_email_idx')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), INDEX)
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user.email, which login, registration and password reset all
+    look users up by. contrib.auth doesn't index it and its model can't be
+    changed from here, so the index is created directly.
+    """
+
+    dependencies = [
+        ('api', '0051_outgoingemail_sending'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
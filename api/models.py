@@ -1,8 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.conf import settings
 import uuid
+from datetime import timedelta
+
+from .placeholders import ImagePlaceholderMixin
+from .pricing import parse_price
 
 class University(models.Model):
     name = models.CharField(max_length=255)
@@ -42,7 +47,7 @@ class Material(models.Model):
     subtitle = models.CharField(max_length=255, null=True)
     file = models.FileField(upload_to='materials/')
 
-class Event(models.Model):
+class Event(ImagePlaceholderMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255, null=True, blank=True)
     description = models.TextField(max_length=1000, null=True, blank=True)
@@ -50,6 +55,7 @@ class Event(models.Model):
     date = models.DateField(null=True, blank=True)
     image = models.ImageField(upload_to='events/', null=True, blank=True)
     # image = models.URLField(max_length=200, null=True, blank=True)
+    image_placeholders = models.JSONField(default=dict, blank=True)  # Dominant colour + size per image field
     is_breaking_news = models.BooleanField(default=False)
     university = models.ForeignKey(
         'University', 
@@ -57,6 +63,8 @@ class Event(models.Model):
         null=True, 
         blank=True
     )
+
+    placeholder_fields = ('image',)
     
     def get_username(self):
         try:
@@ -97,13 +105,14 @@ class RequestEvent(models.Model):
     image2_link.allow_tags = True
     image2_link.short_description = "Image 2"
 
-class Blog(models.Model):
+class Blog(ImagePlaceholderMixin, models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     date = models.DateField(null=True, blank=True)
     content = models.TextField()
     image = models.ImageField(upload_to='blogs/', null=True, blank=True)
     # image = models.URLField(max_length=200, null=True, blank=True)
+    image_placeholders = models.JSONField(default=dict, blank=True)  # Dominant colour + size per image field
     is_breaking_news = models.BooleanField(default=False)
     university = models.ForeignKey(
         'University', 
@@ -113,6 +122,8 @@ class Blog(models.Model):
     )
     # created_at = models.DateTimeField(default=timezone.now)
 
+    placeholder_fields = ('image',)
+
     def __str__(self):
         return self.title
     
@@ -162,6 +173,10 @@ class Community(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     admin = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Kept current by the signals in api.communities; listings read them when
+    # COMMUNITY_STORED_COUNTS is on instead of counting
+    group_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)  # Memberships across all its groups
 
     def __str__(self):
         return self.name
@@ -182,14 +197,22 @@ class Group(models.Model):
     ]
     interaction_permission = models.CharField(max_length=20, choices=ALLOW_INTERACTION_CHOICES, default='all')
 
-    # ManyToManyField to track followers
-    followers = models.ManyToManyField(User, related_name='followed_groups', blank=True)
+    # Followers are the group's UserGroup memberships
+    followers = models.ManyToManyField(User, through='UserGroup', related_name='followed_groups', blank=True)
+
+    # Maintained by Message.save for the "my groups" listing
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_seq = models.PositiveIntegerField(default=0)  # Messages ever posted; never decremented
 
     def __str__(self):
         return self.name
 
     @property
     def follower_count(self):
+        # Listings annotate num_followers rather than counting per group
+        if hasattr(self, 'num_followers'):
+            return self.num_followers
         return self.followers.count()  # Calculate number of followers
 
     @property
@@ -216,24 +239,90 @@ class Message(models.Model):
         if not self.username:
             user_profile = UserProfile.objects.get(user=self.userID)
             self.username = user_profile.username or self.userID.username  # Fallback to User's username
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding and self.group_id:
+            # A message saved late (or with an older timestamp) still counts
+            # but doesn't replace a newer preview
+            newer = models.Q(last_message_at__lte=self.timestamp) | models.Q(last_message_at__isnull=True)
+            Group.objects.filter(pk=self.group_id).update(
+                last_message=models.Case(models.When(newer, then=models.Value(self.pk)), default=models.F('last_message'),
+                                         output_field=models.BigIntegerField()),
+                last_message_at=models.Case(models.When(newer, then=models.Value(self.timestamp)),
+                                            default=models.F('last_message_at')),
+                message_seq=models.F('message_seq') + 1,
+            )
 
     def __str__(self):
         return f"Message from {self.username} in {self.group.name if self.group else 'No Group'}"
 
 
 class UserGroup(models.Model):
+    """Group membership; following a group and joining it are the same thing."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
     is_admin = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Group.message_seq when the member last read the group; the difference is their unread count
+    read_seq = models.PositiveIntegerField(default=0)
 
     class Meta:
-        unique_together = ('user', 'group')
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'user'], name='usergroup_group_user_uniq'),
+        ]
+        indexes = [
+            # The groups a user follows
+            models.Index(fields=['user', 'group'], name='usergroup_user_group_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # New members start with the group's history already read
+        if self._state.adding and not self.read_seq:
+            # Read fresh; a Group instance passed in may predate recent messages
+            self.read_seq = Group.objects.filter(pk=self.group_id).values_list('message_seq', flat=True).first() or 0
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} in {self.group.name}"
 
 
+class GroupActivity(models.Model):
+    """Messages posted and followers gained by a group in one hour; feeds TrendingGroup."""
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='activity')
+    hour = models.DateTimeField()
+    messages = models.PositiveIntegerField(default=0)
+    follows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'hour'], name='groupactivity_group_hour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='groupactivity_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.group} at {self.hour}: {self.messages} messages, {self.follows} follows"
+
+
+class TrendingGroup(models.Model):
+    """Precomputed trending score, rewritten by refresh_trending_groups."""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    # The admin's university at refresh time; groups have no university of their own
+    university = models.ForeignKey(University, on_delete=models.SET_NULL, null=True, blank=True)
+    score = models.FloatField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['university', '-score'], name='trendinggroup_university_idx'),
+            models.Index(fields=['-score'], name='trendinggroup_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.group}: {self.score:.2f}"
+
+
 class Leaders(models.Model):
     names = models.CharField(max_length=255, null=True, blank=True)
     title = models.CharField(max_length=255, null=True, blank=True)
@@ -245,7 +334,7 @@ class Leaders(models.Model):
     def __str__(self):
         return self.names or "Unnamed Leader"
     
-class Product(models.Model):
+class Product(ImagePlaceholderMixin, models.Model):
     PRODUCT_TYPE_CHOICES = [
         ('electronics', 'Electronics'),
         ('furniture', 'Furniture'), 
@@ -264,11 +353,28 @@ class Product(models.Model):
     feature4 = models.CharField(max_length=255, null=True, blank=True)
     warranty = models.CharField(max_length=255, null=True, blank=True)
     price = models.CharField(max_length=255, null=True, blank=True)
+    # Parsed from price on save so listings can filter and sort by it in SQL
+    price_amount = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    price_currency = models.CharField(max_length=3, null=True, blank=True)
     is_sold = models.BooleanField(default=False)
     image1 = models.ImageField(upload_to='e-commerce/', null=True, blank=True)
     image2 = models.ImageField(upload_to='e-commerce/', null=True, blank=True)
     image3 = models.ImageField(upload_to='e-commerce/', null=True, blank=True)
     image4 = models.ImageField(upload_to='e-commerce/', null=True, blank=True)
+    image_placeholders = models.JSONField(default=dict, blank=True)  # Dominant colour + size per image field
+
+    IMAGE_FIELDS = ('image1', 'image2', 'image3', 'image4')
+    placeholder_fields = IMAGE_FIELDS
+
+    class Meta:
+        indexes = [
+            # Category listings of unsold products, newest first, as index range scans
+            models.Index(fields=['material_type', 'is_sold', 'id'], name='product_category_listing_idx'),
+            models.Index(fields=['is_sold', 'id'], name='product_listing_idx'),
+            # Price range filters and price sorting, within a category or across all
+            models.Index(fields=['material_type', 'is_sold', 'price_amount'], name='product_category_price_idx'),
+            models.Index(fields=['is_sold', 'price_amount'], name='product_price_idx'),
+        ]
 
     def get_username(self):
         try:
@@ -276,20 +382,15 @@ class Product(models.Model):
         except UserProfile.DoesNotExist:
             return "No username"
 
-    def __str__(self):
-        return self.title or "Unnamed Material"
-
-    
-class Follow(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    group = models.ForeignKey(Group, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        unique_together = ('user', 'group')  # Ensures a user can only follow a group once
+    def save(self, *args, **kwargs):
+        self.price_amount, self.price_currency = parse_price(self.price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'price_amount', 'price_currency'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f'{self.user} follows {self.group}'
+        return self.title or "Unnamed Material"
 
 
 class PersonalMessage(models.Model):
@@ -325,20 +426,176 @@ class BlockedUser(models.Model):
     
 
 class Notification(models.Model):
+    """
+    Direct notifications get a NotificationDelivery row per recipient when
+    they are sent. Broadcasts (everyone, a university or a campus) are found by
+    each inbox when it is read instead; see api.notifications.
+    """
+    AUDIENCE_DIRECT = 'direct'
+    AUDIENCE_ALL = 'all'
+    AUDIENCE_UNIVERSITY = 'university'
+    AUDIENCE_CAMPUS = 'campus'
+    AUDIENCE_CHOICES = [
+        (AUDIENCE_DIRECT, 'Selected users'),
+        (AUDIENCE_ALL, 'Everyone'),
+        (AUDIENCE_UNIVERSITY, 'University'),
+        (AUDIENCE_CAMPUS, 'Campus'),
+    ]
     title = models.CharField(max_length=255, null=True)
     content = models.TextField()
     time = models.DateTimeField(auto_now_add=True)
-    read = models.BooleanField(default=False)
-    
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default=AUDIENCE_ALL)
+    university = models.ForeignKey(University, on_delete=models.CASCADE, null=True, blank=True)
+    campus = models.ForeignKey(Campus, on_delete=models.CASCADE, null=True, blank=True)
+
+    def clean(self):
+        # The audience decides which counter a broadcast bumps, so its target must be set
+        if self.audience == self.AUDIENCE_UNIVERSITY:
+            if not self.university_id:
+                raise ValidationError({'university': 'Choose the university to notify.'})
+            if self.campus_id:
+                raise ValidationError({'campus': 'Use the campus audience to notify a single campus.'})
+        elif self.audience == self.AUDIENCE_CAMPUS:
+            if not self.campus_id:
+                raise ValidationError({'campus': 'Choose the campus to notify.'})
+            if self.university_id and self.university_id != self.campus.university_id:
+                raise ValidationError({'campus': 'This campus belongs to another university.'})
+        elif self.university_id or self.campus_id:
+            raise ValidationError('Only university and campus notifications take a university or campus.')
+
     def __str__(self):
-        return self.title
-    
+        return self.title or "Untitled notification"
+
+
+class NotificationDelivery(models.Model):
+    """A user's copy of a direct notification, or their read receipt for a broadcast."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='deliveries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_deliveries')
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'notification')
+
+    def __str__(self):
+        return f"{self.notification} for {self.user}"
+
+
+class NotificationInbox(models.Model):
+    """Per-user counters that make the unread count a constant number of lookups."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_inbox')
+    unread_direct = models.IntegerField(default=0)
+    # Broadcasts read so far; every broadcast up to broadcasts_read_through is read
+    broadcasts_read = models.IntegerField(default=0)
+    broadcasts_read_through = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Notification inbox of {self.user}"
+
+
+class BroadcastCounter(models.Model):
+    """Number of broadcasts sent to an audience key: 'all', 'university:<id>' or 'campus:<id>'."""
+    key = models.CharField(max_length=50, unique=True)
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.total}"
+
+
+def otp_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'OTP_TTL_SECONDS', 600))
+
+
 class OTP(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='otp')
     otp_code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=otp_expiry, db_index=True)  # Indexed for the sweeper
+    attempts = models.PositiveSmallIntegerField(default=0)  # Failed verifications
     is_verified = models.BooleanField(default=False)
 
     def __str__(self):
         return f"OTP for {self.user.username} - {self.otp_code}"
-    
\ No newline at end of file
+    
+
+
+class OutgoingEmail(models.Model):
+    """Mail queued by request handlers and delivered by the send_queued_email worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    subject = models.CharField(max_length=255)
+    body = models.TextField()  # Cleared once the mail is sent or given up on; it may hold an OTP
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # When a pending mail is due; while sending, when the worker's claim lapses
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoingemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+
+class PushEvent(models.Model):
+    """
+    A push waiting for the send_queued_pushes worker. Events for the same
+    target and collapse key coalesce into one pending row while it waits.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    KIND_DIRECT_MESSAGE = 'direct_message'
+    KIND_GROUP_MESSAGE = 'group_message'
+    KIND_BREAKING_NEWS = 'breaking_news'
+    KIND_CHOICES = [
+        (KIND_DIRECT_MESSAGE, 'Direct message'),
+        (KIND_GROUP_MESSAGE, 'Group message'),
+        (KIND_BREAKING_NEWS, 'Breaking news'),
+    ]
+    # 'user:<id>', 'group:<id>', 'university:<id>' or 'all'
+    target = models.CharField(max_length=100)
+    collapse_key = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    title = models.CharField(max_length=255, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    data = models.JSONField(default=dict, blank=True)
+    count = models.PositiveIntegerField(default=1)  # Events coalesced into this push
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # When a pending push is due; while sending, when the worker's claim lapses
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='pushevent_due_idx'),
+            models.Index(fields=['target', 'collapse_key', 'status'], name='pushevent_coalesce_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.target} ({self.status})"
+
@@ -0,0 +1,187 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import BroadcastCounter, Notification, NotificationDelivery, NotificationInbox, UserProfile
+
+FAN_OUT_BATCH_SIZE = 1000
+BROADCAST_AUDIENCES = (Notification.AUDIENCE_ALL, Notification.AUDIENCE_UNIVERSITY, Notification.AUDIENCE_CAMPUS)
+
+
+def audience_key(notification):
+    if notification.audience == Notification.AUDIENCE_UNIVERSITY:
+        return f'university:{notification.university_id}'
+    if notification.audience == Notification.AUDIENCE_CAMPUS:
+        return f'campus:{notification.campus_id}'
+    return 'all'
+
+
+def user_audience(user):
+    """Return (university_id, campus_id) from the user's profile; None for anonymous users."""
+    if user is None or not user.is_authenticated:
+        return None, None
+    return UserProfile.objects.filter(user=user).values_list('university_id', 'campus_id').first() or (None, None)
+
+
+def broadcasts_for(university_id, campus_id):
+    condition = Q(audience=Notification.AUDIENCE_ALL)
+    if university_id:
+        condition |= Q(audience=Notification.AUDIENCE_UNIVERSITY, university_id=university_id)
+    if campus_id:
+        condition |= Q(audience=Notification.AUDIENCE_CAMPUS, campus_id=campus_id)
+    return condition
+
+
+def inbox_queryset(user):
+    """Notifications visible to user: their direct ones plus matching broadcasts."""
+    university_id, campus_id = user_audience(user)
+    condition = broadcasts_for(university_id, campus_id)
+    if user is not None and user.is_authenticated:
+        condition |= Q(id__in=NotificationDelivery.objects.filter(user=user).values('notification_id'))
+    return Notification.objects.filter(condition)
+
+
+def read_ids(user, notifications):
+    """Ids among notifications that user has read."""
+    if user is None or not user.is_authenticated:
+        return set()
+    ids = [notification.id for notification in notifications]
+    read = set(NotificationDelivery.objects.filter(user=user, notification_id__in=ids, read_at__isnull=False)
+               .values_list('notification_id', flat=True))
+    read_through = (NotificationInbox.objects.filter(user=user)
+                    .values_list('broadcasts_read_through', flat=True).first() or 0)
+    read.update(
+        notification.id for notification in notifications
+        if notification.audience != Notification.AUDIENCE_DIRECT and notification.id <= read_through
+    )
+    return read
+
+
+def notify_users(user_ids, title, content):
+    """Send a direct notification to user_ids; see deliver()."""
+    with transaction.atomic():
+        notification = Notification.objects.create(title=title, content=content, audience=Notification.AUDIENCE_DIRECT)
+        deliver(notification, user_ids)
+    return notification
+
+
+def deliver(notification, user_ids):
+    """
+    Fan a saved direct notification out to user_ids, writing a delivery row
+    and bumping the unread counter of every recipient in batches of
+    FAN_OUT_BATCH_SIZE. Used by notify_users and the admin.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    with transaction.atomic():
+        for start in range(0, len(user_ids), FAN_OUT_BATCH_SIZE):
+            batch = user_ids[start:start + FAN_OUT_BATCH_SIZE]
+            NotificationDelivery.objects.bulk_create(
+                [NotificationDelivery(notification=notification, user_id=user_id) for user_id in batch]
+            )
+            NotificationInbox.objects.bulk_create(
+                [NotificationInbox(user_id=user_id) for user_id in batch], ignore_conflicts=True
+            )
+            NotificationInbox.objects.filter(user_id__in=batch).update(unread_direct=F('unread_direct') + 1)
+
+
+def broadcast(title, content, university=None, campus=None):
+    """
+    Broadcast to a campus, a university or everyone. Nothing is written per
+    user; only the audience's BroadcastCounter is bumped (by the post_save
+    signal below, which also covers the admin).
+    """
+    if campus is not None:
+        audience = Notification.AUDIENCE_CAMPUS
+    elif university is not None:
+        audience = Notification.AUDIENCE_UNIVERSITY
+    else:
+        audience = Notification.AUDIENCE_ALL
+    return Notification.objects.create(title=title, content=content, audience=audience,
+                                       university=university, campus=campus)
+
+
+def unread_count(user):
+    """
+    Unread notifications for user from their inbox row and at most three
+    broadcast counters. A profile moving to another university or campus can
+    skew it until the next mark_all_read, so it never goes below zero.
+    """
+    university_id, campus_id = user_audience(user)
+    keys = ['all']
+    if university_id:
+        keys.append(f'university:{university_id}')
+    if campus_id:
+        keys.append(f'campus:{campus_id}')
+    inbox = NotificationInbox.objects.filter(user=user).first() or NotificationInbox(user=user)
+    broadcasts = BroadcastCounter.objects.filter(key__in=keys).aggregate(total=Sum('total'))['total'] or 0
+    return max(inbox.unread_direct + broadcasts - inbox.broadcasts_read, 0)
+
+
+def mark_read(user, notification):
+    """Mark one notification read for user; a no-op if it already was."""
+    now = timezone.now()
+    with transaction.atomic():
+        inbox, _ = NotificationInbox.objects.get_or_create(user=user)
+        if notification.audience == Notification.AUDIENCE_DIRECT:
+            updated = NotificationDelivery.objects.filter(
+                user=user, notification=notification, read_at__isnull=True
+            ).update(read_at=now)
+            if updated:
+                NotificationInbox.objects.filter(user=user).update(unread_direct=F('unread_direct') - 1)
+            return
+        if notification.id <= inbox.broadcasts_read_through:
+            return
+        try:
+            with transaction.atomic():
+                NotificationDelivery.objects.create(user=user, notification=notification, read_at=now)
+        except IntegrityError:
+            return  # Already read
+        NotificationInbox.objects.filter(user=user).update(broadcasts_read=F('broadcasts_read') + 1)
+
+
+def mark_all_read(user):
+    """
+    Mark everything read: direct deliveries get read_at, and the broadcast
+    watermark moves to the newest visible broadcast. The per-broadcast read
+    receipts it now covers are dropped and broadcasts_read is recounted.
+    """
+    university_id, campus_id = user_audience(user)
+    visible = Notification.objects.filter(broadcasts_for(university_id, campus_id))
+    with transaction.atomic():
+        NotificationInbox.objects.get_or_create(user=user)
+        inbox = NotificationInbox.objects.select_for_update().get(user=user)
+        NotificationDelivery.objects.filter(user=user, read_at__isnull=True).update(read_at=timezone.now())
+        inbox.unread_direct = 0
+        inbox.broadcasts_read_through = visible.order_by('-id').values_list('id', flat=True).first() or 0
+        inbox.broadcasts_read = visible.filter(id__lte=inbox.broadcasts_read_through).count()
+        NotificationDelivery.objects.filter(
+            user=user, notification__audience__in=BROADCAST_AUDIENCES,
+            notification_id__lte=inbox.broadcasts_read_through,
+        ).delete()
+        inbox.save()
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created and instance.audience != Notification.AUDIENCE_DIRECT:
+        counter, _ = BroadcastCounter.objects.get_or_create(key=audience_key(instance))
+        BroadcastCounter.objects.filter(pk=counter.pk).update(total=F('total') + 1)
+
+
+@receiver(pre_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    """Take a notification about to be deleted out of the counters it is part of."""
+    if instance.audience == Notification.AUDIENCE_DIRECT:
+        unread = instance.deliveries.filter(read_at__isnull=True).values('user_id')
+        NotificationInbox.objects.filter(user_id__in=unread).update(unread_direct=F('unread_direct') - 1)
+        return
+    BroadcastCounter.objects.filter(key=audience_key(instance)).update(total=F('total') - 1)
+    readers = Q(user_id__in=instance.deliveries.filter(read_at__isnull=False).values('user_id'))
+    covered = Q(broadcasts_read_through__gte=instance.id)
+    if instance.audience == Notification.AUDIENCE_UNIVERSITY:
+        covered &= Q(user__userprofile__university_id=instance.university_id)
+    elif instance.audience == Notification.AUDIENCE_CAMPUS:
+        covered &= Q(user__userprofile__campus_id=instance.campus_id)
+    NotificationInbox.objects.filter(readers | covered).update(broadcasts_read=F('broadcasts_read') - 1)
@@ -0,0 +1,142 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .authentication import PROCESS_LOCAL_CACHE_BACKENDS
+
+DEFAULT_PASSWORD_HASHING_WORKERS = 4
+DEFAULT_PASSWORD_HASHING_QUEUE = 16
+DEFAULT_PASSWORD_HASHING_QUEUE_TIMEOUT = 2.0
+DEFAULT_PASSWORD_HASHING_SLOT_LEASE = 30
+SLOT_KEY_PREFIX = 'password-hashing:slot:'
+
+_executor = None
+_admission = None
+_init_lock = threading.Lock()
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-in requests right now, please retry shortly.'
+    default_code = 'password_hashing_busy'
+    wait = 1  # Sent as Retry-After by DRF's exception handler
+
+
+class LocalAdmission:
+    """
+    Per-process cap on hashing calls. Only bounds anything with threaded
+    workers: a one-request-per-process worker never has more than one caller.
+    """
+
+    def __init__(self, limit):
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        return True if self._semaphore.acquire(blocking=False) else None
+
+    def release(self, slot):
+        self._semaphore.release()
+
+
+class SharedAdmission:
+    """
+    Deployment-wide cap: `limit` slot keys in a shared cache, each taken with
+    cache.add() (atomic on every backend) and leased for `lease` seconds so a
+    worker that dies mid-hash can't hold its slot for good.
+    """
+
+    def __init__(self, alias, limit, lease):
+        self.cache = caches[alias]
+        self.limit = limit
+        self.lease = lease
+
+    def acquire(self):
+        start = random.randrange(self.limit)  # Spread callers over the slots
+        for i in range(self.limit):
+            key = f'{SLOT_KEY_PREFIX}{(start + i) % self.limit}'
+            if self.cache.add(key, 1, self.lease):
+                return key
+        return None
+
+    def release(self, slot):
+        self.cache.delete(slot)
+
+
+def build_admission():
+    """
+    The admission cap for the current settings. With a shared cache (the
+    PASSWORD_HASHING_SHARED_CACHE alias, else the default cache when every
+    worker shares it) at most PASSWORD_HASHING_MAX_CONCURRENT hashes run
+    across all processes; otherwise each process allows workers + queue.
+    """
+    alias = getattr(settings, 'PASSWORD_HASHING_SHARED_CACHE', None)
+    if alias is None and settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        alias = 'default'
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_PASSWORD_HASHING_WORKERS)
+    if alias:
+        limit = getattr(settings, 'PASSWORD_HASHING_MAX_CONCURRENT', workers)
+        lease = getattr(settings, 'PASSWORD_HASHING_SLOT_LEASE', DEFAULT_PASSWORD_HASHING_SLOT_LEASE)
+        return SharedAdmission(alias, limit, lease)
+    queue = getattr(settings, 'PASSWORD_HASHING_QUEUE', DEFAULT_PASSWORD_HASHING_QUEUE)
+    return LocalAdmission(workers + queue)
+
+
+def _pool():
+    global _executor, _admission
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_PASSWORD_HASHING_WORKERS)
+                _admission = build_admission()
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor, _admission
+
+
+def run_hashing(fn, *args):
+    """
+    Run a password hashing call on the bounded pool. Fails fast with
+    PasswordHashingBusy when the admission cap is reached, or when the call
+    is still queued after PASSWORD_HASHING_QUEUE_TIMEOUT seconds.
+    """
+    executor, admission = _pool()
+    slot = admission.acquire()
+    if slot is None:
+        raise PasswordHashingBusy()
+    try:
+        future = executor.submit(fn, *args)
+        timeout = getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', DEFAULT_PASSWORD_HASHING_QUEUE_TIMEOUT)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():  # Never started, so give the slot back
+                raise PasswordHashingBusy()
+            return future.result()
+    finally:
+        admission.release(slot)
+
+
+def hash_password(raw_password):
+    return run_hashing(make_password, raw_password)
+
+
+def check_user_password(user, raw_password):
+    """
+    Verify raw_password against user's stored hash off the request thread,
+    rehashing and saving it if the hasher settings changed since it was set.
+    The rehash is best-effort: when the pool is busy it waits for a later login.
+    """
+    is_correct, must_update = run_hashing(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        try:
+            # set_password itself runs on the pool, so the new hash is made there too
+            run_hashing(user.set_password, raw_password)
+        except PasswordHashingBusy:
+            return is_correct
+        user.save(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,58 @@
+from PIL import Image
+
+# Decoding is capped at this size; the placeholder only needs the average colour.
+DRAFT_SIZE = (64, 64)
+
+
+def compute_placeholder(field_file):
+    """
+    Return {'color': '#rrggbb', 'width': w, 'height': h} for an image, or None
+    if it can't be decoded. Works on both fresh uploads and stored files.
+    """
+    try:
+        field_file.open('rb')
+        with Image.open(field_file) as image:
+            width, height = image.size
+            image.draft('RGB', DRAFT_SIZE)  # Lets JPEG decode at reduced scale
+            red, green, blue = image.convert('RGB').resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    finally:
+        try:
+            field_file.seek(0)  # Leave uploads readable for the storage write
+        except (OSError, ValueError):
+            pass
+    return {'color': f'#{red:02x}{green:02x}{blue:02x}', 'width': width, 'height': height}
+
+
+class ImagePlaceholderMixin:
+    """
+    Model mixin keeping `image_placeholders` ({field name: placeholder}) in sync
+    with the fields listed in `placeholder_fields`. Placeholders are computed
+    when a new image is uploaded; existing images are handled by the
+    backfill_image_placeholders command.
+    """
+    placeholder_fields = ()
+
+    def refresh_image_placeholders(self, force=False):
+        """Recompute placeholders for new uploads (or every image with force)."""
+        placeholders = dict(self.image_placeholders or {})
+        for name in self.placeholder_fields:
+            field_file = getattr(self, name)
+            if not field_file:
+                placeholders.pop(name, None)
+            elif force or not field_file._committed:
+                placeholder = compute_placeholder(field_file)
+                if placeholder:
+                    placeholders[name] = placeholder
+                else:
+                    placeholders.pop(name, None)
+        changed = placeholders != (self.image_placeholders or {})
+        self.image_placeholders = placeholders
+        return changed
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.refresh_image_placeholders() and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'image_placeholders'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,53 @@
+import re
+from decimal import Decimal
+
+from django.conf import settings
+
+CURRENCY_PATTERNS = [
+    ('USD', re.compile(r'\$|\busd\b|dollar')),
+    ('KES', re.compile(r'\bkes\b|\bksh')),
+    ('TZS', re.compile(r'\btzs\b|\btsh|\bsh\b|shilingi|/=|/-')),
+]
+# A number with its thousands separated by commas or single spaces in strict
+# groups of three ("25,000", "25 000"), so "iPhone 12 250000" stays two numbers
+AMOUNT = re.compile(
+    r'(?<![\d.,])(\d{1,3}(?:[, ]\d{3}(?!\d))+|\d+)(\.\d+)?(?:\s*(k|m|mil(?:lion)?|elfu)\b)?'
+)
+CURRENCY_WORDS = r'\$|usd|dollars?|kes|ksh\w*|tzs|tsh\w*|sh|shilingi'
+CURRENCY_BEFORE = re.compile(rf'(?:{CURRENCY_WORDS})\.?\s*$')
+CURRENCY_AFTER = re.compile(rf'\s*(?:/=|/-|(?:{CURRENCY_WORDS})\b)')
+MULTIPLIERS = {'k': 1000, 'elfu': 1000, 'm': 1000000, 'mil': 1000000, 'million': 1000000}
+MAX_AMOUNT = Decimal('999999999999.99')  # Fits DecimalField(max_digits=14, decimal_places=2)
+
+
+def parse_price(text):
+    """
+    Best-effort parse of a free-text price such as "TSh 25,000/=", "25k" or
+    "$30.50" into (Decimal amount, currency code). When the text holds several
+    numbers ("2023 model 50k"), the first one with a k/m suffix or a currency
+    next to it wins, otherwise the largest. Returns (None, None) when no amount
+    can be found.
+    """
+    if not text:
+        return None, None
+    lowered = str(text).lower()
+    marked, unmarked = [], []
+    for match in AMOUNT.finditer(lowered):
+        number, fraction, suffix = match.groups()
+        amount = Decimal(re.sub(r'[, ]', '', number) + (fraction or ''))
+        if suffix:
+            amount *= MULTIPLIERS[suffix]
+        if suffix or CURRENCY_BEFORE.search(lowered, 0, match.start()) or CURRENCY_AFTER.match(lowered, match.end()):
+            marked.append(amount)
+        else:
+            unmarked.append(amount)
+    if not marked and not unmarked:
+        return None, None
+    amount = marked[0] if marked else max(unmarked)
+    if amount > MAX_AMOUNT:
+        return None, None
+    currency = next(
+        (code for code, pattern in CURRENCY_PATTERNS if pattern.search(lowered)),
+        getattr(settings, 'PRODUCT_DEFAULT_CURRENCY', 'TZS'),
+    )
+    return amount.quantize(Decimal('0.01')), currency
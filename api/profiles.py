@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UserProfile
+
+DEFAULT_PROFILE_CARD_CACHE = 'default'
+DEFAULT_PROFILE_CARD_CACHE_TTL = 30
+DEFAULT_PROFILE_BATCH_MAX_IDS = 100
+KEY_PREFIX = 'profilecard:'
+
+CARD_FIELDS = (
+    'user_id', 'username', 'user__username', 'profile_picture',
+    'university__name', 'campus__name', 'course__name',
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_CARD_CACHE', DEFAULT_PROFILE_CARD_CACHE)]
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def _card(row):
+    # The picture is kept as its storage name; URLs depend on the request host
+    return {
+        'user_id': row['user_id'],
+        'username': row['username'] or row['user__username'],
+        'profile_picture': row['profile_picture'] or None,
+        'university': row['university__name'],
+        'campus': row['campus__name'],
+        'course': row['course__name'],
+    }
+
+
+def get_profile_cards(user_ids):
+    """
+    Return {user_id: card} for the ids that have a profile. Cards come from
+    the PROFILE_CARD_CACHE alias where present; the rest are loaded with a
+    single joined query and cached for PROFILE_CARD_CACHE_TTL seconds.
+    """
+    cache = _cache()
+    cached = cache.get_many([_key(user_id) for user_id in user_ids])
+    cards = {card['user_id']: card for card in cached.values()}
+    missing = [user_id for user_id in user_ids if user_id not in cards]
+    if missing:
+        rows = UserProfile.objects.filter(user_id__in=missing).values(*CARD_FIELDS)
+        loaded = {row['user_id']: _card(row) for row in rows}
+        ttl = getattr(settings, 'PROFILE_CARD_CACHE_TTL', DEFAULT_PROFILE_CARD_CACHE_TTL)
+        cache.set_many({_key(user_id): card for user_id, card in loaded.items()}, ttl)
+        cards.update(loaded)
+    return cards
+
+
+def invalidate_profile_card(user_id):
+    _cache().delete(_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_profile_card(instance.user_id)
+    # Again after commit, in case a concurrent batch cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_profile_card(instance.user_id))
@@ -0,0 +1,193 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Blog, Event, PushEvent
+
+DEFAULT_PUSH_TRANSPORT = 'api.push.LoopbackPushTransport'
+DEFAULT_PUSH_BATCH_SIZE = 500
+DEFAULT_PUSH_MAX_ATTEMPTS = 5
+DEFAULT_PUSH_RETRY_DELAY = 10  # seconds, doubled after every failure
+DEFAULT_PUSH_CLAIM_TIMEOUT = 300  # seconds before a claimed batch is retried
+DEFAULT_PUSH_SENT_RETENTION_HOURS = 24
+PURGE_CHUNK_SIZE = 5000
+BODY_PREVIEW_LENGTH = 200
+
+# Messages handed to LoopbackPushTransport, like django.core.mail.outbox
+outbox = []
+
+
+class BasePushTransport:
+    """
+    Delivers pushes for send_queued_pushes. send() gets one message per
+    target, {'target': ..., 'pushes': [...]}, and returns an error (or None)
+    for each of them; raising fails the whole batch.
+    """
+
+    def send(self, messages):
+        raise NotImplementedError
+
+
+class LoopbackPushTransport(BasePushTransport):
+    """
+    Keeps messages in api.push.outbox and, when PUSH_LOOPBACK_FILE is set,
+    appends them there as JSON lines. For development and tests.
+    """
+
+    def send(self, messages):
+        outbox.extend(messages)
+        path = getattr(settings, 'PUSH_LOOPBACK_FILE', None)
+        if path:
+            with open(path, 'a') as f:
+                for message in messages:
+                    f.write(json.dumps(message, default=str) + '\n')
+        return [None] * len(messages)
+
+
+def get_push_transport():
+    return import_string(getattr(settings, 'PUSH_TRANSPORT', DEFAULT_PUSH_TRANSPORT))()
+
+
+def queue_push(target, kind, collapse_key, title, body, data=None):
+    """
+    Record a push for the worker. If one with the same target and collapse
+    key is still pending it is updated to the latest event and its count
+    bumped instead. Like queue_mail, the row is part of the caller's
+    transaction.
+    """
+    fields = {'kind': kind, 'title': title or '', 'body': (body or '')[:BODY_PREVIEW_LENGTH], 'data': data or {}}
+    coalesced = PushEvent.objects.filter(
+        target=target, collapse_key=collapse_key, status=PushEvent.STATUS_PENDING
+    ).update(count=F('count') + 1, **fields)
+    if not coalesced:
+        PushEvent.objects.create(target=target, collapse_key=collapse_key, **fields)
+
+
+def _payload(push):
+    return {
+        'kind': push.kind,
+        'collapse_key': push.collapse_key,
+        'title': push.title,
+        'body': push.body,
+        'count': push.count,
+        'data': push.data,
+    }
+
+
+def _record_failure(push, error, max_attempts, retry_delay):
+    push.attempts += 1
+    push.last_error = str(error)
+    if push.attempts >= max_attempts:
+        push.status = PushEvent.STATUS_FAILED
+    else:
+        push.status = PushEvent.STATUS_PENDING
+        push.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay * 2 ** (push.attempts - 1))
+
+
+def _claim_batch(batch_size, claim_timeout):
+    """
+    Mark a batch of due pushes as sending and commit, so the transport call
+    happens without row locks that queue_push would wait on. A claim left by
+    a worker that died is picked up again once it lapses.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers claim side by side
+        batch = list(
+            PushEvent.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[PushEvent.STATUS_PENDING, PushEvent.STATUS_SENDING], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for push in batch:
+            push.status = PushEvent.STATUS_SENDING
+            push.next_attempt_at = now + timedelta(seconds=claim_timeout)
+        PushEvent.objects.bulk_update(batch, ['status', 'next_attempt_at'])
+    return batch
+
+
+def send_queued_pushes(batch_size=None):
+    """
+    Deliver one batch of due pushes through PUSH_TRANSPORT, grouped into a
+    single message per target. Failures are retried with exponential backoff.
+    Returns (sent, failed) counted in PushEvent rows.
+    """
+    batch_size = batch_size or getattr(settings, 'PUSH_BATCH_SIZE', DEFAULT_PUSH_BATCH_SIZE)
+    max_attempts = getattr(settings, 'PUSH_MAX_ATTEMPTS', DEFAULT_PUSH_MAX_ATTEMPTS)
+    retry_delay = getattr(settings, 'PUSH_RETRY_DELAY', DEFAULT_PUSH_RETRY_DELAY)
+    claim_timeout = getattr(settings, 'PUSH_CLAIM_TIMEOUT', DEFAULT_PUSH_CLAIM_TIMEOUT)
+
+    batch = _claim_batch(batch_size, claim_timeout)
+    if not batch:
+        return 0, 0
+
+    by_target = {}
+    for push in batch:
+        by_target.setdefault(push.target, []).append(push)
+    messages = [{'target': target, 'pushes': [_payload(push) for push in pushes]}
+                for target, pushes in by_target.items()]
+    try:
+        errors = get_push_transport().send(messages)
+    except Exception as exc:
+        errors = [exc] * len(messages)
+
+    delivered, failures = [], []
+    for pushes, error in zip(by_target.values(), errors):
+        if error is None:
+            delivered.extend(push.id for push in pushes)
+        else:
+            for push in pushes:
+                _record_failure(push, error, max_attempts, retry_delay)
+                failures.append(push)
+
+    with transaction.atomic():
+        PushEvent.objects.filter(id__in=delivered).update(
+            status=PushEvent.STATUS_SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error=None
+        )
+        PushEvent.objects.bulk_update(failures, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+    return len(delivered), len(failures)
+
+
+def purge_sent_pushes(older_than=None):
+    """Delete pushes sent more than PUSH_SENT_RETENTION_HOURS ago, in chunks. Returns the number deleted."""
+    hours = getattr(settings, 'PUSH_SENT_RETENTION_HOURS', DEFAULT_PUSH_SENT_RETENTION_HOURS)
+    cutoff = older_than or timezone.now() - timedelta(hours=hours)
+    deleted = 0
+    while True:
+        ids = list(PushEvent.objects.filter(status=PushEvent.STATUS_SENT, sent_at__lt=cutoff)
+                   .values_list('id', flat=True)[:PURGE_CHUNK_SIZE])
+        if not ids:
+            return deleted
+        deleted += PushEvent.objects.filter(id__in=ids).delete()[0]
+
+
+@receiver(pre_save, sender=Event)
+@receiver(pre_save, sender=Blog)
+def breaking_news_changing(sender, instance, **kwargs):
+    # Only a save that turns the flag on pushes; one query, and only then
+    instance._became_breaking_news = instance.is_breaking_news and (
+        instance._state.adding or sender.objects.filter(pk=instance.pk, is_breaking_news=False).exists()
+    )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Blog)
+def breaking_news_saved(sender, instance, **kwargs):
+    if not getattr(instance, '_became_breaking_news', False):
+        return
+    instance._became_breaking_news = False
+    kind = sender.__name__.lower()
+    queue_push(
+        target=f'university:{instance.university_id}' if instance.university_id else 'all',
+        kind=PushEvent.KIND_BREAKING_NEWS,
+        collapse_key=f'news:{kind}:{instance.pk}',
+        title=instance.title,
+        body=instance.description if sender is Event else instance.content,
+        data={kind: instance.pk},
+    )
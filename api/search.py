@@ -0,0 +1,180 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product
+
+SEARCH_FIELDS = ('title', 'feature1', 'feature2', 'feature3', 'feature4')
+TOKEN = re.compile(r'\w+')
+DEFAULT_PRODUCT_SEARCH_INDEX_TTL = 60
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+
+class SQLiteFTSBackend:
+    """
+    FTS5 table api_product_fts, kept in sync with api_product by the triggers
+    created in migration 0043. Every term must match, as a prefix; ranked by bm25
+    with title matches weighted double.
+    """
+
+    def search(self, query, offset, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT p.id FROM api_product_fts JOIN api_product p ON p.id = api_product_fts.rowid '
+                'WHERE api_product_fts MATCH %s AND NOT p.is_sold '
+                'ORDER BY bm25(api_product_fts, 2.0, 1.0, 1.0, 1.0, 1.0), p.id DESC LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLFullTextBackend:
+    """FULLTEXT index product_search_ft created in migration 0043, natural language mode."""
+
+    def queryset(self, terms):
+        relevance = RawSQL(
+            'MATCH (title, feature1, feature2, feature3, feature4) AGAINST (%s IN NATURAL LANGUAGE MODE)',
+            [' '.join(terms)],
+        )
+        return (Product.objects.filter(is_sold=False).annotate(relevance=relevance)
+                .filter(relevance__gt=0).order_by('-relevance', '-id').values_list('id', flat=True))
+
+    def search(self, query, offset, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        return list(self.queryset(terms)[offset:offset + limit])
+
+
+class PythonIndexBackend:
+    """
+    In-process inverted index of unsold products, for development and tests
+    on databases without full-text support; every term must match exactly and
+    results are ranked by tf-idf. Saves in this process update it through the
+    Product signals below. Changes it can't see (other workers, queryset
+    update() and bulk_create) are caught by rebuilding when the count or
+    newest id of unsold products moves, or PRODUCT_SEARCH_INDEX_TTL seconds
+    after the last build at the latest.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {product id: term frequency}
+        self._terms = {}  # product id -> indexed terms, for removal
+        self._version = None
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    def _add(self, product_id, values):
+        counts = Counter(term for value in values for term in tokenize(value))
+        for term, count in counts.items():
+            self._postings[term][product_id] = count
+        self._terms[product_id] = set(counts)
+
+    def _current_version(self):
+        return tuple(Product.objects.filter(is_sold=False).aggregate(count=Count('id'), newest=Max('id')).values())
+
+    def _build(self, version):
+        self._postings.clear()
+        self._terms.clear()
+        rows = Product.objects.filter(is_sold=False).values_list('id', *SEARCH_FIELDS)
+        for product_id, *values in rows.iterator(chunk_size=2000):
+            self._add(product_id, values)
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _refresh(self):
+        ttl = getattr(settings, 'PRODUCT_SEARCH_INDEX_TTL', DEFAULT_PRODUCT_SEARCH_INDEX_TTL)
+        version = self._current_version()
+        if version != self._version or time.monotonic() - self._built_at > ttl:
+            self._build(version)
+
+    def _remove(self, product_id):
+        for term in self._terms.pop(product_id, ()):
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(product_id)
+            self._version = self._current_version()  # So this change alone doesn't force a rebuild
+
+    def update(self, product):
+        with self._lock:
+            if self._built_at is None:
+                return  # Picked up by the initial build instead
+            self._remove(product.pk)
+            if not product.is_sold:
+                self._add(product.pk, [getattr(product, field) for field in SEARCH_FIELDS])
+            self._version = self._current_version()
+
+    def search(self, query, offset, limit):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            self._refresh()
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            total = len(self._terms)
+            postings.sort(key=len)  # Intersect starting from the rarest term
+            candidates = set(postings[0]).intersection(*postings[1:])
+            scores = {
+                product_id: sum(p[product_id] * math.log(1 + total / len(p)) for p in postings)
+                for product_id in candidates
+            }
+        ranked = sorted(scores, key=lambda product_id: (-scores[product_id], -product_id))
+        return ranked[offset:offset + limit]
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Pick the product search backend. PRODUCT_SEARCH_BACKEND = 'python' forces
+    the in-process index; by default MySQL FULLTEXT or SQLite FTS5 is used
+    when the database has it.
+    """
+    global _backend
+    if _backend is None:
+        choice = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+        if choice != 'python' and connection.vendor == 'mysql':
+            _backend = MySQLFullTextBackend()
+        elif choice != 'python' and connection.vendor == 'sqlite' and 'api_product_fts' in connection.introspection.table_names():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = PythonIndexBackend()
+    return _backend
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    if isinstance(_backend, PythonIndexBackend):
+        _backend.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    if isinstance(_backend, PythonIndexBackend):
+        _backend.remove(instance.pk)
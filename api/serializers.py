@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
+from .media import MediaURLMixin
+from .passwords import hash_password
 from .models import BlogComment, Leaders, Notification, PersonalMessage, Product, University, Campus, Course, Material, Event, Blog, UserProfile, Message, Community, Group, UserGroup
 
 class UniversitySerializer(serializers.ModelSerializer):
@@ -21,7 +24,7 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'university', 'campus']
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(MediaURLMixin, serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -29,40 +32,35 @@ class MaterialSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'subtitle', 'material_type', 'file_url']
 
     def get_file_url(self, obj):
-        request = self.context.get('request')
-        return request.build_absolute_uri(obj.file.url)
+        return self.media_url(obj.file)
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(MediaURLMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     user_id = serializers.IntegerField(source='user.id', read_only=True)  # Add this line to get the user's ID
     username = serializers.SerializerMethodField()
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'time', 'date', 'image_url', 'is_breaking_news', 'university_id', 'user', 'user_id', 'username']
+        fields = ['id', 'title', 'description', 'time', 'date', 'image_url', 'image_placeholders', 'is_breaking_news', 'university_id', 'user', 'user_id', 'username']
+        read_only_fields = ['image_placeholders']
 
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+        return self.media_url(obj.image)
     
     def get_username(self, obj):
         return obj.user.username
 
-class BlogSerializer(serializers.ModelSerializer):
+class BlogSerializer(MediaURLMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     class Meta:
         model = Blog
-        fields = ['id', 'title', 'content', 'date', 'image_url', 'is_breaking_news', 'university_id', 'comment_count']
+        fields = ['id', 'title', 'content', 'date', 'image_url', 'image_placeholders', 'is_breaking_news', 'university_id', 'comment_count']
+        read_only_fields = ['image_placeholders']
         print(fields[4])
 
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+        return self.media_url(obj.image)
     
     def get_comment_count(self, obj):
         return obj.comment_count
@@ -83,8 +81,10 @@ class UserSerializer(serializers.ModelSerializer):
         # Generate a username based on the email if needed
         username = email.split('@')[0]  # Generate username from email
 
-        # Create the user
-        user = User.objects.create_user(username=username, email=email, password=password)
+        # Create the user, hashing the password on the bounded hashing pool
+        user = User(username=User.normalize_username(username), email=User.objects.normalize_email(email))
+        user.password = hash_password(password)
+        user.save()
         return user
 
 
@@ -119,9 +119,19 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class CommunitySerializer(serializers.ModelSerializer):
+    group_count = serializers.SerializerMethodField()
+    follower_count = serializers.SerializerMethodField()
+
     class Meta:
         model = Community
-        fields = ['id', 'name', 'description', 'admin']
+        fields = ['id', 'name', 'description', 'admin', 'group_count', 'follower_count']
+
+    # Exact counts when the listing annotated them, otherwise the stored counters
+    def get_group_count(self, obj):
+        return getattr(obj, 'num_groups', obj.group_count)
+
+    def get_follower_count(self, obj):
+        return getattr(obj, 'num_followers', obj.follower_count)
 
 
 # class GroupSerializer(serializers.ModelSerializer):
@@ -132,34 +142,69 @@ class CommunitySerializer(serializers.ModelSerializer):
 class GroupSerializer(serializers.ModelSerializer):
     follower_count = serializers.IntegerField(read_only=True)
     username = serializers.SerializerMethodField()
+    # Only present when the queryset was annotated for a requesting user
+    is_following = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Group
         fields = ['id', 'name', 'description', 'profile_picture', 'community', 
-                  'created_at', 'admin', 'follower_count', 'username']
+                  'created_at', 'admin', 'follower_count', 'username', 'is_following']
         
     def get_username(self, obj):
         return obj.admin.username
 
 
+class TrendingGroupSerializer(GroupSerializer):
+    score = serializers.FloatField(source='trend_score', read_only=True)
+
+    class Meta(GroupSerializer.Meta):
+        fields = GroupSerializer.Meta.fields + ['score']
+
+
+class FollowedGroupSerializer(MediaURLMixin, serializers.ModelSerializer):
+    """A membership shown as one row of a user's "my groups" list."""
+    id = serializers.IntegerField(source='group.id')
+    name = serializers.CharField(source='group.name')
+    community = serializers.IntegerField(source='group.community_id')
+    profile_picture = serializers.SerializerMethodField()
+    last_message_at = serializers.DateTimeField(source='group.last_message_at')
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserGroup
+        fields = ['id', 'name', 'community', 'profile_picture', 'is_admin',
+                  'last_message_at', 'last_message', 'unread_count']
+
+    def get_profile_picture(self, obj):
+        return self.media_url(obj.group.profile_picture)
+
+    def get_last_message(self, obj):
+        message = obj.group.last_message
+        if message is None:
+            return None
+        return {'id': message.id, 'username': message.username, 'content': message.content[:200],
+                'timestamp': message.timestamp}
+
+    def get_unread_count(self, obj):
+        return max(obj.group.message_seq - obj.read_seq, 0)
+
+
 class UserGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserGroup
         fields = ['id', 'user', 'group', 'is_admin']
         
-class LeadersSerializer(serializers.ModelSerializer):
+class LeadersSerializer(MediaURLMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     class Meta:
         model = Leaders
         fields = ['names', 'title', 'image']
         
-    def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+    def get_image(self, obj):
+        return self.media_url(obj.image) or ''
     
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(MediaURLMixin, serializers.ModelSerializer):
     image1 = serializers.SerializerMethodField()
     image2 = serializers.SerializerMethodField()
     image3 = serializers.SerializerMethodField()
@@ -170,47 +215,42 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = '__all__'
         extra_kwargs = {
-            'id': {'read_only': False}  # Allow ID to be passed for updates
+            'id': {'read_only': False},  # Allow ID to be passed for updates
+            'image_placeholders': {'read_only': True},
+            'price_amount': {'read_only': True},
+            'price_currency': {'read_only': True},
         }
     def get_image1(self, obj):
-        if obj.image1:
-            return self.context['request'].build_absolute_uri(obj.image1.url)
-        return None  # Return None if image1 is not set
+        return self.media_url(obj.image1)  # None if image1 is not set
 
     def get_image2(self, obj):
-        if obj.image2:
-            return self.context['request'].build_absolute_uri(obj.image2.url)
-        return None  # Return None if image2 is not set
+        return self.media_url(obj.image2)  # None if image2 is not set
 
     def get_image3(self, obj):
-        if obj.image3:
-            return self.context['request'].build_absolute_uri(obj.image3.url)
-        return None  # Return None if image3 is not set
+        return self.media_url(obj.image3)  # None if image3 is not set
 
     def get_image4(self, obj):
-        if obj.image4:
-            return self.context['request'].build_absolute_uri(obj.image4.url)
-        return None  # Return None if image4 is not set
+        return self.media_url(obj.image4)  # None if image4 is not set
     
     def get_username(self, obj):
         return obj.user.username  # Retrieve the username from the user related to the product
     
     def create(self, validated_data):
-        # Handle image fields explicitly
-        image_fields = ['image1', 'image2', 'image3', 'image4']
-        images = {}
-        
-        for field in image_fields:
-            if field in validated_data:
-                images[field] = validated_data.pop(field, None)
-        # Create the product
-        product = super().create(validated_data)
-        # Set image fields after creation
-        for field, value in images.items():
-            if value:
-                setattr(product, field, value)
-                product.save()
-        
+        """
+        Insert the product with its images in a single write. Each image file
+        is stored once, while the row is inserted, and removed again if the
+        insert fails.
+        """
+        product = Product(**validated_data)
+        try:
+            with transaction.atomic():
+                product.save(force_insert=True)
+        except Exception:
+            for field in Product.IMAGE_FIELDS:
+                image = getattr(product, field)
+                if image and image._committed and field in validated_data:
+                    image.storage.delete(image.name)
+            raise
         return product
 
 # class PersonalMessageSerializer(serializers.ModelSerializer):
@@ -227,9 +267,15 @@ class PersonalMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'sender', 'recipient', 'content', 'timestamp', 'recipient_username', 'sender_username']
 
 class NotificationSerializer(serializers.ModelSerializer):
+    read = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
-        fields = ['id', 'title', 'content', 'time', 'read']
+        fields = ['id', 'title', 'content', 'time', 'audience', 'read']
+
+    def get_read(self, obj):
+        # Read state is per user; the view passes the page's read ids in
+        return obj.id in self.context.get('read_ids', ())
 
 class ChatUserSerializer(serializers.Serializer):
     recipient = serializers.IntegerField()
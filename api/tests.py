@@ -1,3 +1,1153 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password, verify_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import LocalTokenCache, SharedTokenCache, build_token_cache, get_token_cache
+from .catalog import get_catalog, invalidate_catalog
+from .communities import recount_communities
+from .mail import purge_sent_mail, send_queued_mail
+from .media import MediaURLBuilder, get_media_url_builder
+from .notifications import broadcast, notify_users, unread_count
+from . import passwords
+from .placeholders import compute_placeholder
+from .pricing import parse_price
+from . import push
+from .push import purge_sent_pushes, send_queued_pushes
+from .models import OTP, Blog, Campus, Community, Course, Group, GroupActivity, Message, Notification, OutgoingEmail, Product, PushEvent, University, UserGroup, UserProfile
+from .search import MySQLFullTextBackend, PythonIndexBackend, SQLiteFTSBackend
+from .serializers import BlogSerializer, ProductSerializer
+from .throttling import DirectMessageRateThrottle, get_bucket_store
+from .trending import record_activity, refresh_trending
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='old-password')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_token_lookup(self):
+        self.assertEqual(self.client.get('/api/validate-token/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/validate-token/')
+        self.assertEqual(response.json()['user_id'], self.user.id)
+
+    def test_logged_out_token_is_rejected_immediately(self):
+        self.assertEqual(self.client.get('/api/validate-token/').status_code, 200)
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/validate-token/').status_code, 401)
+
+    def test_saving_user_evicts_cached_token(self):
+        self.client.get('/api/validate-token/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/validate-token/').status_code, 401)
+
+
+    def test_shared_default_cache_carries_logout_to_every_worker(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': cache_dir}}
+        with self.settings(CACHES=file_cache):
+            worker, other_worker = build_token_cache(), build_token_cache()
+            self.assertIsInstance(worker, SharedTokenCache)
+            other_worker.set(self.token.key, self.token)
+            worker.delete(self.token.key)
+            self.assertIsNone(other_worker.get(self.token.key))
+        local = build_token_cache()
+        self.assertIsInstance(local, LocalTokenCache)
+        self.assertEqual(local.ttl, 5)
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        User.objects.create_user(username='bob', email='bob@example.com', password='secret-password')
+
+    def test_otp_request_queues_mail_without_sending(self):
+        response = APIClient().post('/api/password-reset/request-otp/', {'email': 'bob@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['bob@example.com'])
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.STATUS_SENT)
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        email = OutgoingEmail.objects.create(subject='Hi', body='Body', recipients=['bob@example.com'])
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('connection reset')):
+            self.assertEqual(send_queued_mail(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, email.created_at)
+        # Not due yet, so nothing is picked up
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+    def test_smtp_runs_after_claim_commits_and_bodies_are_cleared(self):
+        email = OutgoingEmail.objects.create(subject='Your code', body='OTP 123456', recipients=['bob@example.com'])
+
+        def send(message):
+            self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.STATUS_SENDING)
+            return 1
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=send, autospec=True):
+            self.assertEqual(send_queued_mail(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body), (OutgoingEmail.STATUS_SENT, ''))
+
+        OutgoingEmail.objects.update(sent_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_sent_mail(), 1)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+
+class OTPTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='carol', email='carol@example.com', password='secret-password')
+        self.client = APIClient()
+
+    def verify(self, code):
+        return self.client.post('/api/password-reset/verify-otp/', {'email': 'carol@example.com', 'otp_code': code}, format='json')
+
+    def test_valid_otp_verifies(self):
+        OTP.objects.create(user=self.user, otp_code='123456')
+        self.assertEqual(self.verify('123456').status_code, 200)
+
+    def test_expired_otp_is_rejected(self):
+        OTP.objects.create(user=self.user, otp_code='123456', expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.verify('123456').status_code, 400)
+
+    def test_otp_stops_verifying_after_max_attempts(self):
+        OTP.objects.create(user=self.user, otp_code='123456')
+        with self.settings(OTP_MAX_ATTEMPTS=3):
+            for _ in range(3):
+                self.assertEqual(self.verify('000000').status_code, 400)
+            self.assertEqual(self.verify('123456').status_code, 400)
+
+    def test_sweeper_deletes_only_expired_rows(self):
+        other = User.objects.create_user(username='dave', email='dave@example.com')
+        OTP.objects.create(user=self.user, otp_code='111111', expires_at=timezone.now() - timedelta(minutes=1))
+        OTP.objects.create(user=other, otp_code='222222')
+        call_command('sweep_expired_otps', chunk_size=1, stdout=StringIO())
+        self.assertEqual(list(OTP.objects.values_list('otp_code', flat=True)), ['222222'])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+
+    def tearDown(self):
+        get_bucket_store().clear()
+
+    def test_login_burst_is_limited_with_retry_after(self):
+        client = APIClient()
+        for _ in range(10):
+            self.assertEqual(client.post('/api/login/', {'email': 'nobody@example.com'}, format='json').status_code, 404)
+        response = client.post('/api/login/', {'email': 'nobody@example.com'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_spoofed_forwarded_for_does_not_pick_a_new_bucket(self):
+        # The proxy appends the real address after whatever the client sent
+        client = APIClient()
+        for i in range(60):
+            response = client.post('/api/login/', {'email': f'user{i}@example.com'}, format='json',
+                                   HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, 203.0.113.7')
+            self.assertEqual(response.status_code, 404)
+        response = client.post('/api/login/', {'email': 'another@example.com'}, format='json',
+                               HTTP_X_FORWARDED_FOR='10.9.9.9, 203.0.113.7')
+        self.assertEqual(response.status_code, 429)
+
+    def test_clients_behind_one_address_get_their_own_account_buckets(self):
+        client = APIClient()
+        for i in range(20):
+            response = client.post('/api/login/', {'email': f'student{i}@example.com'}, format='json')
+            self.assertEqual(response.status_code, 404)
+
+    def test_messages_are_limited_per_sender(self):
+        sender = User.objects.create_user(username='xavier')
+        other = User.objects.create_user(username='yusuf')
+        recipient = User.objects.create_user(username='zawadi')
+        client = APIClient()
+        with mock.patch.object(DirectMessageRateThrottle, 'THROTTLE_RATES', {'direct_message': '2/min'}):
+            for _ in range(2):
+                response = client.post(f'/api/messages/send-direct/{sender.id}/', {'recipient': recipient.id, 'content': 'hi'},
+                                       format='json')
+                self.assertEqual(response.status_code, 201)
+            response = client.post(f'/api/messages/send-direct/{sender.id}/', {'recipient': recipient.id, 'content': 'hi'},
+                                   format='json')
+            self.assertEqual(response.status_code, 429)
+            # Same IP, different sender
+            response = client.post(f'/api/messages/send-direct/{other.id}/', {'recipient': recipient.id, 'content': 'hi'},
+                                   format='json')
+            self.assertEqual(response.status_code, 201)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        university = University.objects.create(name='University of Dar es Salaam')
+        campus = Campus.objects.create(university=university, name='Mlimani')
+        course = Course.objects.create(university=university, campus=campus, name='Computer Science')
+        self.user = User.objects.create_user(username='erin', email='erin@example.com', password='secret-password')
+        UserProfile.objects.create(user=self.user, username='erin', university=university, campus=campus,
+                                   course=course, phone_number='0700000000')
+        self.token = Token.objects.create(user=self.user)
+
+    def test_login_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = APIClient().post('/api/login/', {'email': 'erin@example.com', 'password': 'secret-password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['token'], self.token.key)
+        self.assertEqual(response.json()['profile']['course'], 'Computer Science')
+
+    @override_settings(PASSWORD_HASHING_SHARED_CACHE='default', PASSWORD_HASHING_MAX_CONCURRENT=2)
+    def test_login_storm_fails_fast_and_other_requests_are_served(self):
+        cache.clear()
+        executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(executor.shutdown)
+        entered, finish = threading.Semaphore(0), threading.Event()
+
+        def slow_hash(*args):
+            entered.release()
+            finish.wait(5)
+            return True, False
+
+        with mock.patch.object(passwords, '_pool', return_value=(executor, passwords.build_admission())):
+            # Two logins from other workers hold every slot of the shared cap
+            storm = [threading.Thread(target=passwords.run_hashing, args=(slow_hash,)) for _ in range(2)]
+            for thread in storm:
+                thread.start()
+            for _ in storm:
+                self.assertTrue(entered.acquire(timeout=5))
+
+            credentials = {'email': 'erin@example.com', 'password': 'secret-password'}
+            started = time.monotonic()
+            response = APIClient().post('/api/login/', credentials, format='json')
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(APIClient().get('/api/universities/').status_code, 200)
+
+            finish.set()
+            for thread in storm:
+                thread.join(5)
+            self.assertEqual(APIClient().post('/api/login/', credentials, format='json').status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher',
+                                         'django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_outdated_hash_is_upgraded_unless_the_pool_is_busy(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-password', hasher='md5'))
+        run_hashing = passwords.run_hashing
+
+        def busy_rehash(fn, *args):
+            if fn is verify_password:
+                return run_hashing(fn, *args)
+            raise passwords.PasswordHashingBusy()
+
+        credentials = {'email': 'erin@example.com', 'password': 'secret-password'}
+        with mock.patch.object(passwords, 'run_hashing', busy_rehash):
+            self.assertEqual(APIClient().post('/api/login/', credentials, format='json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+        self.assertEqual(APIClient().post('/api/login/', credentials, format='json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_wrong_password_is_rejected(self):
+        response = APIClient().post('/api/login/', {'email': 'erin@example.com', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        invalidate_catalog()
+        self.addCleanup(invalidate_catalog)
+        self.university = University.objects.create(name='Ardhi University')
+        self.campus = Campus.objects.create(university=self.university, name='Main')
+
+    def register(self, course_name):
+        return APIClient().post('/api/register/', {
+            'email': 'imani@example.com', 'password': 'secret-password', 'username': 'imani',
+            'university_name': 'Ardhi University', 'campus_name': 'Main', 'course_name': course_name,
+            'phone_number': '0700000009',
+        }, format='json')
+
+    def test_registration_sees_courses_added_by_another_worker(self):
+        snapshot = get_catalog()
+        # bulk_create sends no signals, like a save in another process
+        Course.objects.bulk_create([Course(university=self.university, campus=self.campus, name='Architecture')])
+        self.assertEqual(self.register('Surveying').status_code, 400)
+        self.assertEqual(self.register('Architecture').status_code, 201)
+        self.assertEqual(UserProfile.objects.get().course.name, 'Architecture')
+        self.assertIsNot(get_catalog(), snapshot)
+
+
+    def test_unchanged_catalog_is_not_modified(self):
+        etag = APIClient().get('/api/universities/')['ETag']
+        for header in (etag, f'"stale", {etag}', f'W/{etag}', '*'):
+            response = APIClient().get('/api/universities/', HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+        self.assertEqual(APIClient().get('/api/universities/', HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_catalog_saves_change_the_etag(self):
+        def fetch(url):
+            etag = APIClient().get(url)['ETag']
+            return lambda: APIClient().get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+        universities_changed = fetch('/api/universities/')
+        self.university.name = 'Ardhi University Dar es Salaam'
+        self.university.save()
+        self.assertEqual(universities_changed(), 200)
+
+        campuses_changed = fetch(f'/api/universities/{self.university.id}/campuses/')
+        Campus.objects.create(university=self.university, name='Kinondoni')
+        self.assertEqual(campuses_changed(), 200)
+
+        courses_changed = fetch(f'/api/campuses/{self.campus.id}/courses/')
+        Course.objects.create(university=self.university, campus=self.campus, name='Urban Planning')
+        self.assertEqual(courses_changed(), 200)
+        unchanged = fetch(f'/api/campuses/{self.campus.id}/courses/')
+        self.assertEqual(unchanged(), 304)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user(username='frank')
+        self.laptop = Product.objects.create(user=seller, material_type='electronics', title='HP laptop',
+                                             feature1='Laptop bag included')
+        self.charger = Product.objects.create(user=seller, material_type='electronics', title='USB-C charger',
+                                              feature1='Works with any laptop or phone')
+        self.sofa = Product.objects.create(user=seller, material_type='furniture', title='Sofa')
+        Product.objects.create(user=seller, material_type='electronics', title='Old laptop', is_sold=True)
+
+    def assert_ranking(self, backend):
+        self.assertEqual(backend.search('laptop', 0, 10), [self.laptop.id, self.charger.id])
+        self.assertEqual(backend.search('laptop charger', 0, 10), [self.charger.id])
+        self.assertEqual(backend.search('laptop', 1, 10), [self.charger.id])
+        self.assertEqual(backend.search('piano', 0, 10), [])
+
+    def test_fts_ranking(self):
+        self.assert_ranking(SQLiteFTSBackend())
+
+    def test_python_index_ranking_and_updates(self):
+        backend = PythonIndexBackend()
+        self.assert_ranking(backend)
+        backend.update(self.sofa)  # Unchanged row is a no-op
+        self.sofa.title = 'Laptop desk'
+        backend.update(self.sofa)
+        self.assertIn(self.sofa.id, backend.search('laptop', 0, 10))
+        backend.remove(self.sofa.id)
+        self.assertNotIn(self.sofa.id, backend.search('laptop', 0, 10))
+
+    def test_python_index_sees_writes_that_send_no_signals(self):
+        backend = PythonIndexBackend()
+        self.assert_ranking(backend)
+        Product.objects.filter(pk=self.charger.pk).update(is_sold=True)
+        self.assertEqual(backend.search('laptop', 0, 10), [self.laptop.id])
+        desk = Product.objects.bulk_create([Product(user=self.sofa.user, material_type='furniture', title='Laptop desk')])[0]
+        self.assertIn(desk.id, backend.search('laptop', 0, 10))
+        # Edits that keep the count and newest id are picked up once the index expires
+        Product.objects.filter(pk=self.sofa.pk).update(title='Laptop sofa')
+        self.assertNotIn(self.sofa.id, backend.search('laptop', 0, 10))
+        with self.settings(PRODUCT_SEARCH_INDEX_TTL=0):
+            self.assertIn(self.sofa.id, backend.search('laptop', 0, 10))
+
+    def test_mysql_fulltext_query(self):
+        backend = MySQLFullTextBackend()
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.search('  ', 0, 10), [])
+        sql, params = backend.queryset(['laptop', 'charger'])[20:30].query.sql_with_params()
+        match = 'MATCH (title, feature1, feature2, feature3, feature4) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+        self.assertIn(f'NOT "api_product"."is_sold" AND ({match}) > %s', sql)
+        self.assertIn(f'ORDER BY ({match}) DESC, "api_product"."id" DESC LIMIT 10 OFFSET 20', sql)
+        self.assertEqual(params, ('laptop charger', 0, 'laptop charger'))
+
+    def test_search_endpoint_pages_results(self):
+        response = APIClient().get('/api/products/search/', {'q': 'laptop', 'page_size': 1}, HTTP_HOST='127.0.0.1')
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.laptop.id])
+        self.assertIsNotNone(response.json()['next'])
+
+
+class ProductPriceTests(TestCase):
+    def test_parse_price(self):
+        cases = {
+            'TSh 25,000/=': ('25000.00', 'TZS'),
+            '25 000': ('25000.00', 'TZS'),
+            '$30.50': ('30.50', 'USD'),
+            'ksh 800': ('800.00', 'KES'),
+            '2.5m': ('2500000.00', 'TZS'),
+            'iPhone 12 250000': ('250000.00', 'TZS'),
+            'Bei 2 5000': ('5000.00', 'TZS'),
+            '2023 model 50k': ('50000.00', 'TZS'),
+        }
+        for text, (amount, currency) in cases.items():
+            self.assertEqual(parse_price(text), (Decimal(amount), currency), text)
+        self.assertEqual(parse_price('Negotiable'), (None, None))
+        self.assertEqual(parse_price('99999999999999'), (None, None))
+
+    def test_price_filters(self):
+        seller = User.objects.create_user(username='zawadi')
+        cheap = Product.objects.create(user=seller, material_type='books', title='Novel', price='5,000/=')
+        dear = Product.objects.create(user=seller, material_type='books', title='Atlas', price='50k')
+        listed = APIClient().get('/api/products/', {'min_price': '10000'}, HTTP_HOST='127.0.0.1').json()['results']
+        self.assertEqual([p['id'] for p in listed], [dear.id])
+        listed = APIClient().get('/api/products/', {'max_price': '10000'}, HTTP_HOST='127.0.0.1').json()['results']
+        self.assertEqual([p['id'] for p in listed], [cheap.id])
+        for value in ('abc', 'nan', 'Infinity', 'sNaN'):
+            response = APIClient().get('/api/products/', {'min_price': value}, HTTP_HOST='127.0.0.1')
+            self.assertEqual(response.status_code, 400, value)
+
+
+class ProductListingTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user(username='neema')
+        self.phones = [Product.objects.create(user=seller, material_type='electronics', title=f'Phone {n}')
+                       for n in range(5)]
+        self.sold = Product.objects.create(user=seller, material_type='electronics', title='Radio', is_sold=True)
+        self.sofa = Product.objects.create(user=seller, material_type='furniture', title='Sofa')
+
+    def get(self, url, **params):
+        return APIClient().get(url, params, HTTP_HOST='127.0.0.1')
+
+    def ids(self, url, **params):
+        return [p['id'] for p in self.get(url, **params).json()['results']]
+
+    def walk(self, url, **params):
+        """Follow the next links from the first page, collecting ids in order."""
+        seen, page = [], self.get(url, **params).json()
+        while True:
+            seen.extend(p['id'] for p in page['results'])
+            if not page['next']:
+                return seen
+            page = APIClient().get(page['next'], HTTP_HOST='127.0.0.1').json()
+
+    def test_response_shape(self):
+        for url in ('/api/products/', '/api/products/electronics/'):
+            body = self.get(url).json()
+            self.assertEqual(set(body), {'next', 'previous', 'results'}, url)
+            self.assertIsNone(body['next'], url)
+            self.assertIsNone(body['previous'], url)
+
+    def test_sold_products_are_hidden_unless_asked_for(self):
+        self.assertNotIn(self.sold.id, self.ids('/api/products/'))
+        self.assertNotIn(self.sold.id, self.ids('/api/products/electronics/'))
+        for flag in ('true', '1', 'yes'):
+            self.assertIn(self.sold.id, self.ids('/api/products/', include_sold=flag), flag)
+            self.assertIn(self.sold.id, self.ids('/api/products/electronics/', include_sold=flag), flag)
+        self.assertNotIn(self.sold.id, self.ids('/api/products/', include_sold='false'))
+
+    def test_newest_first(self):
+        phones = [p.id for p in reversed(self.phones)]
+        self.assertEqual(self.ids('/api/products/'), [self.sofa.id, *phones])
+        self.assertEqual(self.ids('/api/products/electronics/'), phones)
+
+    def test_cursor_walks_every_row_once(self):
+        everything = [p.id for p in Product.objects.filter(is_sold=False).order_by('-id')]
+        self.assertEqual(self.walk('/api/products/', page_size=2), everything)
+        phones = [p.id for p in reversed(self.phones)]
+        self.assertEqual(self.walk('/api/products/electronics/', page_size=2), phones)
+        with_sold = [self.sold.id, *phones]
+        self.assertEqual(self.walk('/api/products/electronics/', page_size=2, include_sold='true'), with_sold)
+
+    def test_rows_added_while_paging_do_not_shift_the_cursor(self):
+        first = self.get('/api/products/electronics/', page_size=2).json()
+        Product.objects.create(user=self.sofa.user, material_type='electronics', title='Newer phone')
+        second = APIClient().get(first['next'], HTTP_HOST='127.0.0.1').json()
+        phones = [p.id for p in reversed(self.phones)]
+        self.assertEqual([p['id'] for p in first['results']], phones[:2])
+        self.assertEqual([p['id'] for p in second['results']], phones[2:4])
+        self.assertIsNotNone(second['previous'])
+
+    def test_unknown_category(self):
+        self.assertEqual(self.get('/api/products/boats/').status_code, 404)
+
+
+class ProductCreateTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        storages = override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.seller = User.objects.create_user(username='grace')
+
+    def image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def post(self, **extra):
+        data = {'id': 500, 'user': self.seller.id, 'material_type': 'fashion', 'title': 'Dress',
+                'image1': self.image('front.png'), 'image2': self.image('back.png'), **extra}
+        return APIClient().post('/api/products/add/', data, format='multipart', HTTP_HOST='127.0.0.1')
+
+    def test_product_and_images_are_written_once(self):
+        # User lookup, then the INSERT inside its savepoint
+        with self.assertNumQueries(4):
+            response = self.post()
+        self.assertEqual(response.status_code, 201)
+        product = Product.objects.get()
+        self.assertTrue(product.image1.name.startswith('e-commerce/front'))
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_octet_stream_uploads_are_typed_from_their_bytes(self):
+        image = self.image('front.png')
+        image.content_type = 'application/octet-stream'
+        self.assertEqual(self.post(image1=image).status_code, 201)
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_unsupported_and_oversized_files_are_rejected(self):
+        text = SimpleUploadedFile('notes.png', b'not an image', content_type='application/octet-stream')
+        self.assertEqual(self.post(image1=text).status_code, 415)
+        text = SimpleUploadedFile('notes.txt', b'not an image', content_type='text/plain')
+        self.assertEqual(self.post(image1=text).status_code, 415)
+        with self.settings(MAX_UPLOAD_FILE_SIZE=16):
+            self.assertEqual(self.post().status_code, 413)
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Product.objects.exists())
+
+    def test_images_are_removed_when_the_insert_fails(self):
+        Product.objects.create(id=500, user=self.seller, material_type='fashion')
+        response = self.post()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+
+class MediaURLTests(TestCase):
+    def request(self, **extra):
+        return APIRequestFactory().get('/api/products/', HTTP_HOST='127.0.0.1', **extra)
+
+    def test_base_from_request(self):
+        builder = MediaURLBuilder(self.request())
+        self.assertEqual(builder.base, 'http://127.0.0.1/materials/')
+        builder = MediaURLBuilder(self.request(secure=True))
+        self.assertEqual(builder.url_for_name('blogs/a.png'), 'https://127.0.0.1/materials/blogs/a.png')
+
+    def test_media_base_url_override(self):
+        for base in ('https://cdn.example/m', 'https://cdn.example/m/', 'https://cdn.example/m//'):
+            with self.subTest(base=base), override_settings(MEDIA_BASE_URL=base):
+                builder = MediaURLBuilder(self.request())
+                self.assertEqual(builder.url_for_name('blogs/a.png'), 'https://cdn.example/m/blogs/a.png')
+                # The override needs no request at all
+                self.assertEqual(MediaURLBuilder().url_for_name('/blogs/a.png'), 'https://cdn.example/m/blogs/a.png')
+
+    def test_names_are_percent_encoded(self):
+        builder = MediaURLBuilder(self.request())
+        self.assertEqual(builder.url_for_name('e-commerce/my photo#1?.png'),
+                         'http://127.0.0.1/materials/e-commerce/my%20photo%231%3F.png')
+        self.assertEqual(builder.url_for_name('blogs/ndizi ñ.jpg'),
+                         'http://127.0.0.1/materials/blogs/ndizi%20%C3%B1.jpg')
+
+    def test_empty_fields(self):
+        builder = MediaURLBuilder(self.request())
+        self.assertIsNone(builder.url(None))
+        self.assertIsNone(builder.url(Blog().image))
+        self.assertIsNone(builder.url_for_name(''))
+        self.assertIsNone(builder.url_for_name(None))
+        # Neither an override nor a request: nothing to build from
+        self.assertIsNone(MediaURLBuilder().url_for_name('blogs/a.png'))
+
+    def test_builder_is_cached_per_request(self):
+        http_request = self.request()
+        builder = get_media_url_builder(http_request)
+        self.assertIs(get_media_url_builder(http_request), builder)
+        # The DRF Request wrapping it shares the same builder
+        self.assertIs(get_media_url_builder(Request(http_request)), builder)
+        self.assertIsNot(get_media_url_builder(self.request()), builder)
+        other = self.request()
+        with mock.patch('api.media.MediaURLBuilder', wraps=MediaURLBuilder) as builder_class:
+            for _ in range(3):
+                get_media_url_builder(other).url_for_name('blogs/a.png')
+        builder_class.assert_called_once_with(other)
+
+
+class MediaSerializerURLTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='baraka')
+        self.product = Product.objects.create(user=author, material_type='fashion', title='Kitenge',
+                                              image1='e-commerce/kitenge front.png', image3='e-commerce/side.png')
+        self.blog = Blog.objects.create(author=author, title='Exams', content='Soon', image='blogs/exam timetable.png')
+        self.request = APIRequestFactory().get('/api/products/', HTTP_HOST='127.0.0.1')
+
+    def product_images(self):
+        data = ProductSerializer(self.product, context={'request': self.request}).data
+        return [data[name] for name in Product.IMAGE_FIELDS]
+
+    def blog_image(self):
+        return BlogSerializer(self.blog, context={'request': self.request}).data['image_url']
+
+    def test_urls_from_request(self):
+        self.assertEqual(self.product_images(), [
+            'http://127.0.0.1/materials/e-commerce/kitenge%20front.png', None,
+            'http://127.0.0.1/materials/e-commerce/side.png', None,
+        ])
+        self.assertEqual(self.blog_image(), 'http://127.0.0.1/materials/blogs/exam%20timetable.png')
+
+    @override_settings(MEDIA_BASE_URL='https://cdn.example/media/')
+    def test_urls_from_media_base_url(self):
+        self.assertEqual(self.product_images(), [
+            'https://cdn.example/media/e-commerce/kitenge%20front.png', None,
+            'https://cdn.example/media/e-commerce/side.png', None,
+        ])
+        self.assertEqual(self.blog_image(), 'https://cdn.example/media/blogs/exam%20timetable.png')
+
+    def test_blog_without_image(self):
+        self.blog.image = None
+        self.assertIsNone(self.blog_image())
+
+
+class ImagePlaceholderTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        storages = override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.author = User.objects.create_user(username='baraka')
+
+    def image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (8, 6), (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_compute_placeholder(self):
+        upload = self.image('red.png')
+        self.assertEqual(compute_placeholder(upload), {'color': '#c81e1e', 'width': 8, 'height': 6})
+        self.assertEqual(upload.read(8), b'\x89PNG\r\n\x1a\n')  # Rewound for the storage write
+        self.assertIsNone(compute_placeholder(SimpleUploadedFile('bad.png', b'not an image')))
+
+    def test_upload_sets_placeholder_and_backfill_fills_the_rest(self):
+        blog = Blog.objects.create(author=self.author, title='Open day', content='', image=self.image('open.png'))
+        self.assertEqual(blog.image_placeholders['image']['color'], '#c81e1e')
+        # Rows written before placeholders existed
+        Blog.objects.update(image_placeholders={})
+        Blog.objects.bulk_create([Blog(author=self.author, title='Broken', content='', image='blogs/missing.png')])
+
+        out = StringIO()
+        call_command('backfill_image_placeholders', stdout=out)
+        self.assertIn('Blog: updated 1 rows', out.getvalue())
+        blog.refresh_from_db()
+        self.assertEqual(blog.image_placeholders, {'image': {'color': '#c81e1e', 'width': 8, 'height': 6}})
+        self.assertEqual(Blog.objects.get(title='Broken').image_placeholders, {})
+        out = StringIO()
+        call_command('backfill_image_placeholders', stdout=out)
+        self.assertIn('Blog: updated 0 rows', out.getvalue())
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        university = University.objects.create(name='University of Dodoma')
+        campus = Campus.objects.create(university=university, name='Main')
+        course = Course.objects.create(university=university, campus=campus, name='Law')
+        for name in ('amani', 'amina', 'baraka', 'salama'):
+            User.objects.create_user(username=name)
+        UserProfile.objects.create(user=User.objects.get(username='amina'), university=university,
+                                   campus=campus, course=course, phone_number='0700000001')
+        self.course = course
+
+    def get(self, **params):
+        return APIClient().get('/api/users/', params)
+
+    def test_prefix_search_is_paginated_in_username_order(self):
+        page = self.get(q='Am', page_size=1).json()
+        self.assertEqual([u['username'] for u in page['results']], ['amani'])
+        page = APIClient().get(page['next']).json()
+        self.assertEqual([u['username'] for u in page['results']], ['amina'])
+        self.assertIsNone(page['next'])
+
+    def test_contains_search_and_profile_filter(self):
+        results = self.get(q='ama', match='contains').json()['results']
+        self.assertEqual([u['username'] for u in results], ['amani', 'salama'])
+        results = self.get(course=self.course.id).json()['results']
+        self.assertEqual([u['username'] for u in results], ['amina'])
+
+
+class ProfileCardsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        university = University.objects.create(name='Ardhi University')
+        campus = Campus.objects.create(university=university, name='Main')
+        course = Course.objects.create(university=university, campus=campus, name='Architecture')
+        self.ids = []
+        for name in ('hana', 'idd', 'juma'):
+            user = User.objects.create_user(username=name)
+            UserProfile.objects.create(user=user, username=name, university=university, campus=campus,
+                                       course=course, phone_number='0700000002')
+            self.ids.append(user.id)
+
+    def get(self, ids):
+        return APIClient().get('/api/user-profiles/', {'ids': ','.join(map(str, ids))})
+
+    def test_batch_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            response = self.get([self.ids[2], self.ids[0], 999])
+        self.assertEqual([card['username'] for card in response.json()['results']], ['juma', 'hana'])
+        self.assertEqual(response.json()['results'][0]['course'], 'Architecture')
+        with self.assertNumQueries(0):
+            self.get([self.ids[0], self.ids[2]])
+
+    def test_update_invalidates_the_card(self):
+        self.get(self.ids)
+        response = APIClient().put(f'/api/update-profile/{self.ids[1]}/', {'username': 'iddi', 'phone_number': '0711'},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get([self.ids[1]]).json()['results'][0]['username'], 'iddi')
+
+    def test_too_many_ids_are_rejected(self):
+        with self.settings(PROFILE_BATCH_MAX_IDS=2):
+            self.assertEqual(self.get(self.ids).status_code, 400)
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        university = University.objects.create(name='Mzumbe University')
+        self.campus = Campus.objects.create(university=university, name='Morogoro')
+        other_campus = Campus.objects.create(university=university, name='Mbeya')
+        course = Course.objects.create(university=university, campus=self.campus, name='Accounting')
+        self.user = User.objects.create_user(username='kibwana')
+        UserProfile.objects.create(user=self.user, university=university, campus=self.campus, course=course,
+                                   phone_number='0700000003')
+        self.other = User.objects.create_user(username='lulu')
+        self.everyone = broadcast('Exams', 'Timetable is out')
+        self.own_campus = broadcast('Water', 'No water today', university=university, campus=self.campus)
+        broadcast('Power', 'Outage', university=university, campus=other_campus)
+        self.direct = notify_users([self.user.id, self.other.id], 'Order', 'Your order shipped')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def titles(self, response):
+        return [(n['title'], n['read']) for n in response.json()['results']]
+
+    def test_inbox_merges_direct_and_matching_broadcasts(self):
+        response = self.client.get('/api/notification/')
+        self.assertEqual(self.titles(response), [('Order', False), ('Water', False), ('Exams', False)])
+        self.assertEqual(unread_count(self.user), 3)
+        anonymous = APIClient().get('/api/notification/')
+        self.assertEqual(self.titles(anonymous), [('Exams', False)])
+
+    def test_read_state_is_per_user(self):
+        self.client.post(f'/api/notification/{self.direct.id}/read/')
+        response = self.client.post(f'/api/notification/{self.everyone.id}/read/')
+        self.assertEqual(response.json()['unread'], 1)
+        self.client.post(f'/api/notification/{self.everyone.id}/read/')
+        self.assertEqual(unread_count(self.user), 1)
+        self.assertEqual(unread_count(self.other), 2)
+        self.assertEqual(self.titles(self.client.get('/api/notification/')),
+                         [('Order', True), ('Water', False), ('Exams', True)])
+
+    def test_read_all_and_later_notifications(self):
+        self.client.post(f'/api/notification/{self.everyone.id}/read/')
+        self.client.post('/api/notification/read-all/')
+        self.assertEqual(unread_count(self.user), 0)
+        broadcast('Holiday', 'Campus closed')
+        self.assertEqual(self.client.get('/api/notification/unread-count/').json(), {'unread': 1})
+        self.own_campus.delete()
+        self.direct.delete()
+        self.assertEqual(unread_count(self.user), 1)
+        self.assertEqual(unread_count(self.other), 2)
+
+    def test_unread_count_is_constant_cost(self):
+        for _ in range(5):
+            broadcast('More', 'news')
+        with self.assertNumQueries(3):
+            self.assertEqual(unread_count(self.user), 8)
+
+
+    def test_broadcast_targets_are_validated(self):
+        university = self.campus.university
+        with self.assertRaises(ValidationError):
+            Notification(title='Fees', content='Due Friday', audience=Notification.AUDIENCE_UNIVERSITY).full_clean()
+        with self.assertRaises(ValidationError):
+            Notification(title='Fees', content='Due Friday', audience=Notification.AUDIENCE_CAMPUS).full_clean()
+        with self.assertRaises(ValidationError):
+            Notification(title='Fees', content='Due Friday', audience=Notification.AUDIENCE_ALL, university=university).full_clean()
+        Notification(title='Fees', content='Due Friday', audience=Notification.AUDIENCE_CAMPUS, university=university,
+                     campus=self.campus).full_clean()
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_sends_direct_notifications_to_recipients(self):
+        admin_user = User.objects.create_superuser(username='mkuu', email='mkuu@example.com', password='x')
+        client = Client()
+        client.force_login(admin_user)
+        data = {'title': 'Library', 'content': 'Book overdue', 'audience': Notification.AUDIENCE_DIRECT}
+        response = client.post('/admin/api/notification/add/', data)
+        self.assertEqual(response.status_code, 200)  # Form redisplayed: no recipients
+        response = client.post('/admin/api/notification/add/', {**data, 'recipients': 'kibwana, nobody'})
+        self.assertContains(response, 'No user with username or email: nobody')
+        response = client.post('/admin/api/notification/add/', {**data, 'recipients': 'kibwana'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual((unread_count(self.user), unread_count(self.other)), (4, 2))
+
+
+class PushOutboxTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        push.outbox.clear()
+        self.sender = User.objects.create_user(username='mosi')
+        self.recipient = User.objects.create_user(username='neema')
+
+    def send_dm(self, content):
+        return APIClient().post(f'/api/messages/send-direct/{self.sender.id}/', {'recipient': self.recipient.id, 'content': content},
+                                format='json')
+
+    def test_direct_messages_coalesce_per_sender(self):
+        self.assertEqual(self.send_dm('Hi').status_code, 201)
+        self.send_dm('Are you there?')
+        pending = PushEvent.objects.get()
+        self.assertEqual((pending.target, pending.count, pending.body), (f'user:{self.recipient.id}', 2, 'Are you there?'))
+
+        self.assertEqual(send_queued_pushes(), (1, 0))
+        self.assertEqual(push.outbox[0]['target'], f'user:{self.recipient.id}')
+        self.send_dm('Hello?')
+        self.assertEqual(PushEvent.objects.filter(status=PushEvent.STATUS_PENDING).count(), 1)
+
+    def test_one_message_per_target_and_retry_on_failure(self):
+        community = Community.objects.create(name='Sports', description='', admin=self.sender)
+        group = Group.objects.create(name='Football', description='', community=community, admin=self.sender)
+        group.followers.add(self.sender)
+        APIClient().post(f'/api/groups/{group.id}/messages/send/', {'userID': self.sender.id, 'content': 'Match at 4',
+                                                                     'username': 'mosi'}, format='json')
+        Blog.objects.create(author=self.sender, title='Campus closed', content='Flooding', is_breaking_news=True)
+        blog = Blog.objects.create(author=self.sender, title='Fees', content='Deadline moved')
+        blog.is_breaking_news = True
+        blog.save()
+        self.assertEqual(PushEvent.objects.filter(target='all').count(), 2)
+
+        with mock.patch.object(push.LoopbackPushTransport, 'send', side_effect=OSError('unreachable')):
+            self.assertEqual(send_queued_pushes(), (0, 3))
+        self.assertEqual(send_queued_pushes(), (0, 0))
+        PushEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_pushes(), (3, 0))
+        self.assertEqual(sorted((m['target'], len(m['pushes'])) for m in push.outbox), [('all', 2), (f'group:{group.id}', 1)])
+
+    def test_transport_runs_after_claim_commits_and_sent_rows_are_purged(self):
+        self.send_dm('Hi')
+
+        def send(transport, messages):
+            # The claim is committed: new events start a fresh row instead of waiting on a lock
+            self.assertEqual(PushEvent.objects.get().status, PushEvent.STATUS_SENDING)
+            self.send_dm('Still there?')
+            return [None] * len(messages)
+
+        with mock.patch.object(push.LoopbackPushTransport, 'send', send):
+            self.assertEqual(send_queued_pushes(), (1, 0))
+        self.assertEqual(sorted(PushEvent.objects.values_list('status', flat=True)),
+                         [PushEvent.STATUS_PENDING, PushEvent.STATUS_SENT])
+
+        # A claim whose worker died is picked up again once it lapses
+        PushEvent.objects.filter(status=PushEvent.STATUS_PENDING).update(
+            status=PushEvent.STATUS_SENDING, next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_queued_pushes(), (1, 0))
+
+        PushEvent.objects.filter(body='Hi').update(sent_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_sent_pushes(), 1)
+        self.assertEqual(list(PushEvent.objects.values_list('body', flat=True)), ['Still there?'])
+
+
+class GroupListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='omari')
+        self.follower = User.objects.create_user(username='pendo')
+        self.community = Community.objects.create(name='Clubs', description='', admin=self.admin)
+        Group.objects.bulk_create(
+            Group(name=f'Club {i}', description='', community=self.community, admin=self.admin) for i in range(1000)
+        )
+        self.newest = Group.objects.order_by('-id').first()
+        self.newest.followers.add(self.admin, self.follower)
+
+    def test_listing_is_one_query_per_page(self):
+        url = f'/api/communities/{self.community.id}/groups/'
+        with self.assertNumQueries(1):
+            page = APIClient().get(url, {'page_size': 100, 'user_id': self.follower.id}).json()
+        self.assertEqual(len(page['results']), 100)
+        first = page['results'][0]
+        self.assertEqual((first['id'], first['follower_count'], first['username'], first['is_following']),
+                         (self.newest.id, 2, 'omari', True))
+        self.assertFalse(page['results'][1]['is_following'])
+        with self.assertNumQueries(1):
+            page = APIClient().get(page['next']).json()
+        self.assertEqual((page['results'][0]['follower_count'], page['results'][0]['is_following']), (0, False))
+        anonymous = APIClient().get(url).json()
+        self.assertNotIn('is_following', anonymous['results'][0])
+
+
+class GroupMembershipTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.user = User.objects.create_user(username='rehema')
+        community = Community.objects.create(name='Faith', description='', admin=self.user)
+        self.group = Group.objects.create(name='Choir', description='', community=community, admin=self.user)
+
+    def send(self):
+        return APIClient().post(f'/api/groups/{self.group.id}/messages/send/',
+                                {'userID': self.user.id, 'content': 'Practice at 6', 'username': 'rehema'}, format='json')
+
+    def toggle_follow(self):
+        return APIClient().post(f'/api/groups/{self.group.id}/follow/', {'userID': self.user.id}, format='json')
+
+    def test_follow_toggle_is_seen_by_messaging_and_counts(self):
+        self.assertEqual(self.send().status_code, 403)
+
+        response = self.toggle_follow()
+        self.assertEqual((response.json()['is_following'], response.json()['follower_count']), (True, 1))
+        self.assertEqual(self.send().status_code, 201)
+        self.assertEqual(list(self.user.followed_groups.all()), [self.group])
+
+        response = self.toggle_follow()
+        self.assertEqual((response.json()['is_following'], response.json()['follower_count']), (False, 0))
+        self.assertFalse(UserGroup.objects.exists())
+
+    def test_admin_membership_is_not_toggled_off(self):
+        UserGroup.objects.create(user=self.user, group=self.group, is_admin=True)
+        response = self.toggle_follow()
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(UserGroup.objects.get(user=self.user, group=self.group).is_admin)
+
+
+class FollowedGroupsTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.user = User.objects.create_user(username='saidi')
+        self.other = User.objects.create_user(username='tumaini')
+        community = Community.objects.create(name='Study', description='', admin=self.other)
+        self.groups = [Group.objects.create(name=f'Study {i}', description='', community=community, admin=self.other)
+                       for i in range(300)]
+        Message.objects.create(userID=self.other, username='tumaini', group=self.groups[0], content='Old news')
+        for group in self.groups:
+            UserGroup.objects.create(user=self.user, group=group)
+        for text in ('Quiz tomorrow', 'Bring calculators'):
+            Message.objects.create(userID=self.other, username='tumaini', group=self.groups[5], content=text)
+        Message.objects.create(userID=self.other, username='tumaini', group=self.groups[9], content='Room changed')
+
+    def followed(self):
+        return APIClient().get(f'/api/users/{self.user.id}/groups/').json()
+
+    def test_most_recent_first_with_unread_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            groups = self.followed()
+        self.assertEqual(len(groups), 300)
+        self.assertEqual([(g['id'], g['unread_count']) for g in groups[:3]],
+                         [(self.groups[9].id, 1), (self.groups[5].id, 2), (self.groups[0].id, 0)])
+        self.assertEqual(groups[1]['last_message']['content'], 'Bring calculators')
+        self.assertIsNone(groups[3]['last_message'])
+
+    def test_reading_and_posting_clear_the_unread_count(self):
+        response = APIClient().post(f'/api/groups/{self.groups[5].id}/read/', {'userID': self.user.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        APIClient().post(f'/api/groups/{self.groups[9].id}/messages/send/',
+                         {'userID': self.user.id, 'content': 'Thanks', 'username': 'saidi'}, format='json')
+        groups = self.followed()
+        self.assertEqual([(g['id'], g['unread_count']) for g in groups[:2]],
+                         [(self.groups[9].id, 0), (self.groups[5].id, 0)])
+
+
+    def test_deleting_the_newest_message_restores_the_previous_preview(self):
+        Message.objects.filter(group=self.groups[5], content='Bring calculators').delete()
+        group = self.followed()[1]
+        self.assertEqual((group['id'], group['last_message']['content']), (self.groups[5].id, 'Quiz tomorrow'))
+        Message.objects.filter(group=self.groups[5]).delete()
+        self.groups[5].refresh_from_db()
+        self.assertEqual((self.groups[5].last_message, self.groups[5].last_message_at), (None, None))
+
+    def test_older_message_does_not_replace_the_preview(self):
+        late = Message(userID=self.other, username='tumaini', group=self.groups[9], content='Sent offline')
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(hours=1)):
+            late.save()
+        self.groups[9].refresh_from_db()
+        self.assertEqual((self.groups[9].last_message.content, self.groups[9].message_seq), ('Room changed', 2))
+
+    def test_members_added_through_followers_start_read(self):
+        newcomer = User.objects.create_user(username='upendo')
+        self.groups[5].followers.add(newcomer)
+        newcomer.followed_groups.add(self.groups[9])
+        self.assertEqual(dict(UserGroup.objects.filter(user=newcomer).values_list('group_id', 'read_seq')),
+                         {self.groups[5].id: 2, self.groups[9].id: 1})
+
+
+class TrendingGroupsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        university = University.objects.create(name='Sokoine University')
+        campus = Campus.objects.create(university=university, name='Main')
+        course = Course.objects.create(university=university, campus=campus, name='Agriculture')
+        self.admin = User.objects.create_user(username='upendo')
+        UserProfile.objects.create(user=self.admin, university=university, campus=campus, course=course,
+                                   phone_number='0700000004')
+        self.university = university
+        community = Community.objects.create(name='Hobbies', description='', admin=self.admin)
+        self.busy, self.quiet, self.stale = (
+            Group.objects.create(name=name, description='', community=community, admin=self.admin)
+            for name in ('Busy', 'Quiet', 'Stale')
+        )
+
+    def test_recent_activity_ranks_higher_and_old_buckets_expire(self):
+        for _ in range(4):
+            Message.objects.create(userID=self.admin, username='upendo', group=self.busy, content='hi')
+        self.quiet.followers.add(self.admin)
+        record_activity(self.stale.id, messages=50, at=timezone.now() - timedelta(days=10))
+
+        self.assertEqual(refresh_trending(), 2)
+        self.assertFalse(GroupActivity.objects.filter(group=self.stale).exists())
+        response = APIClient().get('/api/groups/trending/', {'university': self.university.id, 'page_size': 1})
+        page = response.json()
+        self.assertEqual([g['name'] for g in page['results']], ['Busy'])
+        self.assertEqual(page['results'][0]['follower_count'], 0)
+        second = APIClient().get(page['next']).json()['results']
+        self.assertEqual([g['name'] for g in second], ['Quiet'])
+        self.assertLess(second[0]['score'], page['results'][0]['score'])
+
+    def test_groups_drop_out_when_their_activity_leaves_the_window(self):
+        record_activity(self.busy.id, messages=1, at=timezone.now() - timedelta(hours=2))
+        refresh_trending()
+        refresh_trending(now=timezone.now() + timedelta(days=4))
+        self.assertEqual(APIClient().get('/api/groups/trending/', {'page': 2}).json()['results'], [])
+        self.assertEqual(refresh_trending(), 0)
+
+
+class CommunityListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='vumilia')
+        self.member = User.objects.create_user(username='wema')
+        self.communities = [Community.objects.create(name=f'Community {i}', description='', admin=self.admin)
+                            for i in range(30)]
+        first, last = self.communities[0], self.communities[-1]
+        chess, drama = (Group.objects.create(name=name, description='', community=last, admin=self.admin)
+                        for name in ('Chess', 'Drama'))
+        Group.objects.create(name='Poetry', description='', community=first, admin=self.admin)
+        chess.followers.add(self.admin, self.member)
+        UserGroup.objects.create(user=self.member, group=drama)
+
+    def counts(self, community):
+        return (community['name'], community['group_count'], community['follower_count'])
+
+    def test_counts_are_one_query_per_page(self):
+        with self.assertNumQueries(1):
+            page = APIClient().get('/api/communities/', {'page_size': 10}).json()
+        self.assertEqual(len(page['results']), 10)
+        self.assertEqual(self.counts(page['results'][0]), ('Community 29', 2, 3))
+        self.assertEqual(self.counts(page['results'][1]), ('Community 28', 0, 0))
+
+    def test_stored_counters_follow_writes(self):
+        last = self.communities[-1]
+        Group.objects.get(name='Chess').followers.remove(self.member)
+        Group.objects.get(name='Drama').delete()
+        with self.settings(COMMUNITY_STORED_COUNTS=True):
+            results = APIClient().get('/api/communities/', {'page_size': 30}).json()['results']
+        self.assertEqual(self.counts(results[0]), (last.name, 1, 1))
+        self.assertEqual(self.counts(results[-1]), ('Community 0', 1, 0))
+
+        Community.objects.update(group_count=0, follower_count=0)
+        recount_communities()
+        last.refresh_from_db()
+        self.assertEqual((last.group_count, last.follower_count), (1, 1))
+
+    def test_moving_a_group_moves_its_counts(self):
+        first, last = self.communities[0], self.communities[-1]
+        chess = Group.objects.get(name='Chess')
+        chess.community = first
+        chess.save()
+        first.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((first.group_count, first.follower_count), (2, 2))
+        self.assertEqual((last.group_count, last.follower_count), (1, 1))
+
+    def test_counters_never_go_below_zero(self):
+        Community.objects.update(group_count=0, follower_count=0)
+        Group.objects.get(name='Drama').delete()
+        last = Community.objects.get(pk=self.communities[-1].pk)
+        self.assertEqual((last.group_count, last.follower_count), (0, 0))
+
+
+class CollectOrphanedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        storages = override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        author = User.objects.create_user(username='tumaini')
+        Blog.objects.bulk_create([
+            Blog(author=author, title='Moved', content='', image='events/shared.jpg'),
+            Blog(author=author, title='Legacy', content='', image='/materials/blogs/legacy.jpg'),
+            Blog(author=author, title='Linked', content='', image='https://example.com/materials/blogs/linked.jpg'),
+        ])
+        for name in ('events/shared.jpg', 'blogs/legacy.jpg', 'blogs/linked.jpg', 'blogs/orphan.jpg', 'blogs/fresh.jpg'):
+            self.write(name, old=name != 'blogs/fresh.jpg')
+
+    def write(self, name, old=True):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        if old:
+            stale = time.time() - 48 * 3600
+            os.utime(path, (stale, stale))
+
+    def files(self, root):
+        return sorted(os.path.relpath(os.path.join(path, name), root).replace(os.sep, '/')
+                      for path, _, names in os.walk(root) for name in names)
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_orphaned_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_reports(self):
+        self.assertIn('Would reclaim 1 orphaned files (10 bytes)', self.collect())
+        self.assertEqual(len(self.files(self.media_root)), 5)
+
+    def test_delete_keeps_referenced_and_recent_files(self):
+        self.collect('--delete')
+        self.assertEqual(self.files(self.media_root),
+                         ['blogs/fresh.jpg', 'blogs/legacy.jpg', 'blogs/linked.jpg', 'events/shared.jpg'])
+        self.collect('--delete', '--grace-hours', '0')
+        self.assertNotIn('blogs/fresh.jpg', self.files(self.media_root))
+
+    def test_quarantine_moves_orphans(self):
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+        self.assertIn('Quarantined 1', self.collect('--quarantine', quarantine))
+        self.assertEqual(self.files(quarantine), ['blogs/orphan.jpg'])
+        self.assertNotIn('blogs/orphan.jpg', self.files(self.media_root))
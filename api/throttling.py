@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+DEFAULT_RATE_LIMIT_LOCAL_SIZE = 100000
+SHARED_KEY_PREFIX = 'ratelimit:'
+
+
+def take_token(state, now, capacity, refill_rate):
+    """
+    Apply one request to a token bucket. state is (tokens, timestamp) or None
+    for a full bucket. Returns (allowed, new_state, seconds_until_next_token).
+    """
+    tokens, updated = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0.0
+    return False, (tokens, now), (1 - tokens) / refill_rate
+
+
+class LocalBucketStore:
+    """Buckets in process memory, evicting the least recently used past maxsize."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        with self._lock:
+            allowed, state, wait = take_token(self._buckets.get(key), time.time(), capacity, refill_rate)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedBucketStore:
+    """
+    Buckets in one of the Django CACHES so all workers share a limit. The
+    read-modify-write isn't atomic, so concurrent bursts may slightly overshoot.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, refill_rate):
+        key = SHARED_KEY_PREFIX + key
+        allowed, state, wait = take_token(self.cache.get(key), time.time(), capacity, refill_rate)
+        # Once it has had time to refill completely a bucket can be forgotten
+        self.cache.set(key, state, int(capacity / refill_rate) + 1)
+        return allowed, wait
+
+    def clear(self):
+        self.cache.clear()
+
+
+_bucket_store = None
+
+
+def get_bucket_store():
+    """Return the RATE_LIMIT_SHARED_CACHE store if configured, else the local one."""
+    global _bucket_store
+    if _bucket_store is None:
+        alias = getattr(settings, 'RATE_LIMIT_SHARED_CACHE', None)
+        if alias:
+            _bucket_store = SharedBucketStore(alias)
+        else:
+            _bucket_store = LocalBucketStore(getattr(settings, 'RATE_LIMIT_LOCAL_SIZE', DEFAULT_RATE_LIMIT_LOCAL_SIZE))
+    return _bucket_store
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket per scope and client (user id when authenticated, otherwise
+    IP). A rate of "10/min" in DEFAULT_THROTTLE_RATES allows bursts of 10,
+    refilled continuously at 10 per minute. Rejections carry Retry-After.
+
+    The IP comes from DRF's get_ident(), so REST_FRAMEWORK['NUM_PROXIES'] must
+    match the proxies in front of the app; otherwise a client-supplied
+    X-Forwarded-For would pick its own bucket.
+    """
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self._wait = get_bucket_store().take(key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AccountRateThrottle(TokenBucketThrottle):
+    """
+    Bucket per email address in the request body, whichever IP it comes
+    from. Paired with a generous per-IP bucket so a campus behind one NAT
+    address isn't limited as a single client.
+    """
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email:
+            return None
+        return f'{self.scope}:email:{str(email).strip().lower()}'
+
+
+class SenderRateThrottle(TokenBucketThrottle):
+    """Bucket per sending user: the URL's user_id or the body's userID, else per IP."""
+
+    def get_cache_key(self, request, view):
+        sender = view.kwargs.get('user_id')
+        if sender is None and hasattr(request.data, 'get'):
+            sender = request.data.get('userID')
+        if sender is None:
+            return super().get_cache_key(request, view)
+        return f'{self.scope}:sender:{sender}'
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class LoginAccountRateThrottle(AccountRateThrottle):
+    scope = 'login_account'
+
+
+class RegisterRateThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class RegisterAccountRateThrottle(AccountRateThrottle):
+    scope = 'register_account'
+
+
+class PasswordResetRateThrottle(TokenBucketThrottle):
+    scope = 'password_reset'
+
+
+class PasswordResetAccountRateThrottle(AccountRateThrottle):
+    scope = 'password_reset_account'
+
+
+class DirectMessageRateThrottle(SenderRateThrottle):
+    scope = 'direct_message'
+
+
+class GroupMessageRateThrottle(SenderRateThrottle):
+    scope = 'group_message'
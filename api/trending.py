@@ -0,0 +1,98 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Group, GroupActivity, Message, TrendingGroup, UserGroup
+
+DEFAULT_TRENDING_WINDOW_HOURS = 72
+DEFAULT_TRENDING_HALF_LIFE_HOURS = 12
+DEFAULT_TRENDING_MESSAGE_WEIGHT = 1.0
+DEFAULT_TRENDING_FOLLOW_WEIGHT = 3.0
+DEFAULT_TRENDING_CACHE_TTL = 60
+CHUNK_SIZE = 1000
+
+
+def record_activity(group_id, messages=0, follows=0, at=None):
+    """Add to the group's counters for the current hour, creating the bucket on first use."""
+    hour = (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    increments = {'messages': F('messages') + messages, 'follows': F('follows') + follows}
+    if GroupActivity.objects.filter(group_id=group_id, hour=hour).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            GroupActivity.objects.create(group_id=group_id, hour=hour, messages=messages, follows=follows)
+    except IntegrityError:
+        # Another writer created the bucket in the meantime
+        GroupActivity.objects.filter(group_id=group_id, hour=hour).update(**increments)
+
+
+def refresh_trending(now=None):
+    """
+    Rescore every group with activity in the last TRENDING_WINDOW_HOURS from
+    its hourly buckets, each weighted down by half per
+    TRENDING_HALF_LIFE_HOURS of age, and rewrite TrendingGroup. Only the
+    buckets inside the window are read; older ones are deleted. Returns the
+    number of groups ranked.
+    """
+    now = now or timezone.now()
+    window = timedelta(hours=getattr(settings, 'TRENDING_WINDOW_HOURS', DEFAULT_TRENDING_WINDOW_HOURS))
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', DEFAULT_TRENDING_HALF_LIFE_HOURS) * 3600
+    message_weight = getattr(settings, 'TRENDING_MESSAGE_WEIGHT', DEFAULT_TRENDING_MESSAGE_WEIGHT)
+    follow_weight = getattr(settings, 'TRENDING_FOLLOW_WEIGHT', DEFAULT_TRENDING_FOLLOW_WEIGHT)
+
+    scores = defaultdict(float)
+    buckets = GroupActivity.objects.filter(hour__gte=now - window).values_list('group_id', 'hour', 'messages', 'follows')
+    for group_id, hour, messages, follows in buckets.iterator(chunk_size=CHUNK_SIZE):
+        age = max((now - hour).total_seconds(), 0)
+        scores[group_id] += (messages * message_weight + follows * follow_weight) * 0.5 ** (age / half_life)
+
+    group_ids = list(scores)
+    universities = {}
+    for start in range(0, len(group_ids), CHUNK_SIZE):
+        universities.update(Group.objects.filter(id__in=group_ids[start:start + CHUNK_SIZE])
+                            .values_list('id', 'admin__userprofile__university_id'))
+
+    with transaction.atomic():
+        TrendingGroup.objects.bulk_create(
+            [TrendingGroup(group_id=group_id, university_id=universities.get(group_id), score=score, refreshed_at=now)
+             for group_id, score in scores.items() if group_id in universities],
+            # MySQL upserts on any unique key and rejects an explicit target
+            update_conflicts=True,
+            unique_fields=['group'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=['university', 'score', 'refreshed_at'],
+            batch_size=CHUNK_SIZE,
+        )
+        # Groups whose activity has all left the window
+        TrendingGroup.objects.filter(refreshed_at__lt=now).delete()
+    GroupActivity.objects.filter(hour__lt=now - window).delete()
+    return len(universities)
+
+
+@receiver(post_save, sender=Message)
+def message_posted(sender, instance, created, **kwargs):
+    if created and instance.group_id:
+        record_activity(instance.group_id, messages=1)
+
+
+@receiver(post_save, sender=UserGroup)
+def membership_created(sender, instance, created, **kwargs):
+    if created:
+        record_activity(instance.group_id, follows=1)
+
+
+@receiver(m2m_changed, sender=UserGroup)
+def followers_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # group.followers.add() / user.followed_groups.add() bypass UserGroup.save
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for group_id in pk_set:
+            record_activity(group_id, follows=1)
+    else:
+        record_activity(instance.pk, follows=len(pk_set))
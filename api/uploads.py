@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, UnsupportedMediaType
+
+DEFAULT_MAX_UPLOAD_BODY_SIZE = 40 * 1024 * 1024
+DEFAULT_MAX_UPLOAD_FILE_SIZE = 10 * 1024 * 1024
+DEFAULT_UPLOAD_ALLOWED_CONTENT_TYPES = (
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic',
+    'application/pdf',
+)
+# Types clients send when they don't know better; the file's first bytes decide
+GENERIC_CONTENT_TYPES = ('application/octet-stream', '')
+SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (4, b'ftypheic', 'image/heic'),
+    (4, b'ftypheix', 'image/heic'),
+    (4, b'ftypmif1', 'image/heic'),
+    (0, b'%PDF-', 'application/pdf'),
+)
+
+
+def sniff_content_type(head):
+    """Content type from a file's leading bytes, or None if it isn't one we recognise."""
+    for offset, signature, content_type in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+    return None
+
+
+def max_body_size():
+    return getattr(settings, 'MAX_UPLOAD_BODY_SIZE', DEFAULT_MAX_UPLOAD_BODY_SIZE)
+
+
+def max_file_size():
+    return getattr(settings, 'MAX_UPLOAD_FILE_SIZE', DEFAULT_MAX_UPLOAD_FILE_SIZE)
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file straight to a temporary file on disk, rejecting
+    unexpected content types before any data is written and aborting as soon
+    as a single file grows past MAX_UPLOAD_FILE_SIZE. Files sent as
+    application/octet-stream are typed from their first bytes instead.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args, **kwargs):
+        self.sniff = content_type in GENERIC_CONTENT_TYPES
+        if not self.sniff and content_type not in self.allowed_content_types():
+            raise UnsupportedMediaType(content_type or 'unknown', detail=f'Unsupported file type for "{field_name}".')
+        if content_length is not None and content_length > max_file_size():
+            raise UploadTooLarge(f'"{field_name}" exceeds the {max_file_size()} byte limit.')
+        super().new_file(field_name, file_name, content_type, content_length, *args, **kwargs)
+
+    def allowed_content_types(self):
+        return getattr(settings, 'UPLOAD_ALLOWED_CONTENT_TYPES', DEFAULT_UPLOAD_ALLOWED_CONTENT_TYPES)
+
+    def reject_unknown(self, head):
+        content_type = sniff_content_type(head)
+        if content_type not in self.allowed_content_types():
+            self.file.close()  # Deletes the partial temporary file
+            raise UnsupportedMediaType(self.content_type or 'unknown',
+                                       detail=f'Unsupported file type for "{self.field_name}".')
+        self.file.content_type = content_type
+        self.sniff = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sniff:
+            # The first chunk is at least 64 KB unless the whole file is smaller
+            self.reject_unknown(raw_data)
+        if start + len(raw_data) > max_file_size():
+            self.file.close()  # Deletes the partial temporary file
+            raise UploadTooLarge(f'"{self.field_name}" exceeds the {max_file_size()} byte limit.')
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.sniff:
+            self.reject_unknown(b'')  # Empty file
+        return super().file_complete(file_size)
+
+
+class StreamingUploadMixin:
+    """
+    APIView mixin installing LimitedTemporaryFileUploadHandler for the request
+    before anything can read the body.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects bodies larger than MAX_UPLOAD_BODY_SIZE from Content-Length alone."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_body_size():
+            return JsonResponse(
+                {'error': f'Request body exceeds the {max_body_size()} byte limit.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        return self.get_response(request)
@@ -1,6 +1,6 @@
 from django.urls import path
-from .views import (BlockUserView, ChatUsersListView, CheckBlockStatusView, DeleteMessageView, FollowGroupView, GetMessagesView, LeadersView, LogoutUser, NotificationList, ProductCreateView, ProductDeleteView, ProductListByCategoryView, ProductMarkAsSoldView, ProductUpdateView,RegisterUser, LoginUser, RequestPasswordReset, ResetPassword, SendDirectMessageView, SendMessageView, UnblockUserView, UniversityList, CampusList, CourseList, 
-                    AddMaterial, MaterialList, EventList, BlogList, UserListView, UserProfileUpdateView, UserProfileView,CreateMessageView,
+from .views import (BlockUserView, CatalogView, ChatUsersListView, CheckBlockStatusView, DeleteMessageView, FollowedGroupsView, FollowGroupView, GetMessagesView, LeadersView, LogoutUser, MarkGroupReadView, NotificationList, NotificationMarkAllReadView, NotificationMarkReadView, NotificationUnreadCountView, ProductCreateView, ProductDeleteView, ProductListByCategoryView, ProductMarkAsSoldView, ProductSearchView, ProductUpdateView,RegisterUser, LoginUser, RequestPasswordReset, ResetPassword, ValidateToken, SendDirectMessageView, SendMessageView, TrendingGroupsView, UnblockUserView, UniversityList, CampusList, CourseList, 
+                    AddMaterial, MaterialList, EventList, BlogList, UserListView, UserProfileUpdateView, UserProfileView, ProfileCardsView, CreateMessageView,
     MessageListView,
     CreateCommunityView,
     CommunityListView,
@@ -16,14 +16,18 @@ urlpatterns = [
     path('register/', RegisterUser.as_view(), name='register'),
     path('login/', LoginUser.as_view(), name='login'),
     path('logout/', LogoutUser.as_view(), name='logout'),
+    path('validate-token/', ValidateToken.as_view(), name='validate-token'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('user-profile/<int:user_id>/', UserProfileView.as_view(), name='user-profile'),
+    path('user-profiles/', ProfileCardsView.as_view(), name='profile-cards'),
     path('update-profile/<int:user_id>/', UserProfileUpdateView.as_view(), name='update-profile'),
     path('universities/', UniversityList.as_view(), name='universities'),
     path('campuses/', CampusList.as_view(), name='campuses'),
     path('courses/', CourseList.as_view(), name='courses'),
     path('universities/<int:university_id>/campuses/', CampusList.as_view(), name='campuses'),
     path('campuses/<int:campus_id>/courses/', CourseList.as_view(), name='courses'),
+    path('catalog/', CatalogView.as_view(), name='catalog'),
+    path('catalog/<int:university_id>/', CatalogView.as_view(), name='catalog-university'),
     path('materials/add/', AddMaterial.as_view(), name='add_material'),
     
     path('password-reset/request-otp/', RequestPasswordReset.as_view(), name='request_password_reset'),
@@ -54,8 +58,11 @@ urlpatterns = [
 
     # Groups
     path('groups/create/', CreateGroupView.as_view(), name='create-group'),
+    path('groups/trending/', TrendingGroupsView.as_view(), name='trending-groups'),
     path('communities/<community_id>/groups/', GroupListView.as_view(), name='group-list'),
     path('groups/<int:group_id>/follow/', FollowGroupView.as_view(), name='toggle_follow'),
+    path('groups/<int:group_id>/read/', MarkGroupReadView.as_view(), name='mark-group-read'),
+    path('users/<int:user_id>/groups/', FollowedGroupsView.as_view(), name='followed-groups'),
     
     # Group management
     path('groups/join/<int:group_id>/', JoinGroupView.as_view(), name='join-group'),
@@ -70,6 +77,7 @@ urlpatterns = [
     # e-commerce
     path('products/add/', ProductCreateView.as_view(), name='product-add'),
     path('products/', ProductCreateView.as_view(), name='list_product'),
+    path('products/search/', ProductSearchView.as_view(), name='product_search'),
     path('products/<str:category>/', ProductListByCategoryView.as_view(), name='products_by_category'),
     path('products/<int:pk>/delete/', ProductDeleteView.as_view(), name='product_delete'),
     path('products/<int:pk>/', ProductUpdateView.as_view(), name='product-update'),
@@ -77,6 +85,9 @@ urlpatterns = [
     
     # Notification
     path('notification/', NotificationList.as_view(), name='list-notifications'),
+    path('notification/unread-count/', NotificationUnreadCountView.as_view(), name='notification-unread-count'),
+    path('notification/read-all/', NotificationMarkAllReadView.as_view(), name='notification-read-all'),
+    path('notification/<int:pk>/read/', NotificationMarkReadView.as_view(), name='notification-read'),
     path('users/', UserListView.as_view(), name='user-list'),
     
     # Blog Comments URLs
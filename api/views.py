@@ -1,30 +1,51 @@
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404
-from django.views import View
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics, permissions
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
-from django.db.models import Max, F, Q
+from django.db.models import Count, Exists, Max, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.db import models
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 import random
-from django.core.mail import send_mail
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
-from .models import OTP, BlockedUser, BlogComment, Follow, Leaders, Notification, PersonalMessage, Product, University, Campus, Course, Material, Event, Blog, UserProfile, Message, Community, Group, UserGroup
-from .serializers import (BlogCommentSerializer, ChatUserSerializer, NotificationSerializer, PersonalMessageSerializer, ProductSerializer, UniversitySerializer, CampusSerializer, CourseSerializer, 
+from rest_framework.utils.urls import replace_query_param
+from django.utils.http import parse_etags
+from .authentication import CachedTokenAuthentication
+from .catalog import get_catalog, resolve_names
+from .communities import annotate_community_counts
+from .mail import queue_mail
+from .notifications import inbox_queryset, mark_all_read, mark_read, read_ids, unread_count
+from .media import get_media_url_builder
+from .pagination import NewestFirstCursorPagination, UsernameCursorPagination
+from .passwords import check_user_password, hash_password
+from .profiles import DEFAULT_PROFILE_BATCH_MAX_IDS, get_profile_cards
+from .push import queue_push
+from .search import get_search_backend
+from .throttling import (DirectMessageRateThrottle, GroupMessageRateThrottle, LoginAccountRateThrottle,
+                         LoginRateThrottle, PasswordResetAccountRateThrottle, PasswordResetRateThrottle,
+                         RegisterAccountRateThrottle, RegisterRateThrottle)
+from .trending import DEFAULT_TRENDING_CACHE_TTL
+from .uploads import StreamingUploadMixin
+from .models import OTP, otp_expiry, BlockedUser, BlogComment, Leaders, PersonalMessage, Product, PushEvent, Material, Event, Blog, UserProfile, Message, Community, Group, UserGroup
+from .serializers import (BlogCommentSerializer, ChatUserSerializer, NotificationSerializer, PersonalMessageSerializer, ProductSerializer,
                           MaterialSerializer, EventSerializer, BlogSerializer, 
-                          UserSerializer, UserProfileSerializer,MessageSerializer, CommunitySerializer, GroupSerializer, UserGroupSerializer, LeadersSerializer)
+                          UserSerializer, UserProfileSerializer,MessageSerializer, CommunitySerializer, FollowedGroupSerializer, GroupSerializer, TrendingGroupSerializer, UserGroupSerializer, LeadersSerializer)
 
 
 
@@ -32,44 +53,48 @@ from .serializers import (BlogCommentSerializer, ChatUserSerializer, Notificatio
 # User registration view
 class RegisterUser(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterRateThrottle, RegisterAccountRateThrottle]
 
     def post(self, request):
         university_name = request.data.get('university_name')
         campus_name = request.data.get('campus_name')
         course_name = request.data.get('course_name')
 
-        # Retrieve university, campus, and course
-        try:
-            university = University.objects.get(name=university_name)
-            campus = Campus.objects.get(name=campus_name, university=university)
-            course = Course.objects.get(name=course_name, campus=campus, university=university)
-        except University.DoesNotExist:
+        # Resolve university, campus, and course from the cached catalog
+        university_id, campus_id, course_id = resolve_names(university_name, campus_name, course_name)
+        if university_id is None:
             return Response({'error': 'Invalid university selection'}, status=status.HTTP_400_BAD_REQUEST)
-        except Campus.DoesNotExist:
+        if campus_id is None:
             return Response({'error': 'Invalid campus selection'}, status=status.HTTP_400_BAD_REQUEST)
-        except Course.DoesNotExist:
+        if course_id is None:
             return Response({'error': 'Invalid course selection'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check for existing username and email
-        if User.objects.filter(username=request.data.get('username')).exists():
-            return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
-        if User.objects.filter(email=request.data.get('email')).exists():
-            return Response({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
+        # Check for existing username and email in one query (auth_user has no
+        # unique constraint on email to rely on)
+        username = request.data.get('username')
+        email = request.data.get('email')
+        for existing_username, existing_email in User.objects.filter(Q(username=username) | Q(email=email)).values_list('username', 'email')[:2]:
+            if existing_username == username:
+                return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
+            if existing_email == email:
+                return Response({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Create the user using the serializer
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                user = serializer.save()
-                token, created = Token.objects.get_or_create(user=user)
-                UserProfile.objects.create(
-                    user=user,
-                    university=university,
-                    campus=campus,
-                    course=course,
-                    phone_number=request.data.get('phone_number'),
-                    username = request.data.get('username')
-                )
+                # The generated username is covered by auth_user's unique constraint
+                with transaction.atomic():
+                    user = serializer.save()
+                    token = Token.objects.create(user=user)
+                    UserProfile.objects.create(
+                        user=user,
+                        university_id=university_id,
+                        campus_id=campus_id,
+                        course_id=course_id,
+                        phone_number=request.data.get('phone_number'),
+                        username = username
+                    )
                 return Response({'token': token.key, 'email': user.email}, status=status.HTTP_201_CREATED)
             except IntegrityError:
                 return Response({'error': 'Username or email already exists'}, status=status.HTTP_400_BAD_REQUEST)
@@ -81,51 +106,66 @@ class RegisterUser(APIView):
 # Login view
 class LoginUser(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginRateThrottle, LoginAccountRateThrottle]
 
     def post(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
-        
+
+        # Profile, user, token and the profile's catalog rows in one joined query
+        try:
+            profile = UserProfile.objects.select_related(
+                'user', 'user__auth_token', 'university', 'campus', 'course'
+            ).get(user__email=email)
+        except UserProfile.DoesNotExist:
+            return self.post_without_profile(email, password)
+        user = profile.user
+
+        # Verify password
+        if not check_user_password(user, password):
+            return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token = Token.objects.create(user=user)
+
+        # Combine user and profile info in response
+        response_data = {
+            'user_id': user.id,  # Add user ID here
+            'token': token.key,
+            'profile': UserProfileSerializer(profile).data
+        }
+
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def post_without_profile(self, email, password):
+        """Error responses for an email with no profile, as before the joined lookup."""
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Verify password
-        if user.check_password(password):
-            token, created = Token.objects.get_or_create(user=user)
-            try:
-                # Get the user's profile and serialize it
-                profile = UserProfile.objects.get(user=user)
-                profile_serializer = UserProfileSerializer(profile)
-            except UserProfile.DoesNotExist:
-                return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
-
-            # Combine user and profile info in response
-            response_data = {
-                'user_id': user.id,  # Add user ID here
-                'token': token.key,
-                'profile': profile_serializer.data
-            }
-
-            return Response(response_data, status=status.HTTP_200_OK)
+        if check_user_password(user, password):
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
 
 # Logout view
 class LogoutUser(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]  # Ensure only authenticated users can log out
 
     def post(self, request):
         try:
             # Get the user's token
-            request.user.auth_token.delete()  # Delete the user's token
+            request.user.auth_token.delete()  # Delete the user's token (also evicts it from the auth cache)
             return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
         except:
             return Response({"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST)
         
 class ValidateToken(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -139,6 +179,7 @@ class ValidateToken(APIView):
 
 class RequestPasswordReset(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetRateThrottle, PasswordResetAccountRateThrottle]
 
     def post(self, request):
         email = request.data.get('email')
@@ -151,16 +192,19 @@ class RequestPasswordReset(APIView):
         # Generate a 6-digit OTP
         otp_code = f"{random.randint(100000, 999999)}"
 
-        # Create or update the OTP entry for the user
-        OTP.objects.update_or_create(user=user, defaults={'otp_code': otp_code, 'is_verified': False})
+        with transaction.atomic():
+            # Create or update the OTP entry for the user
+            OTP.objects.update_or_create(user=user, defaults={
+                'otp_code': otp_code, 'is_verified': False, 'attempts': 0, 'expires_at': otp_expiry(),
+            })
 
-        # Send the OTP to the user's email
-        send_mail(
-            subject="Password Reset OTP",
-            message=f"Your OTP code for password reset is {otp_code}",
-            from_email="noreply@yourdomain.com",
-            recipient_list=[email],
-        )
+            # Queue the OTP email; the send_queued_email worker delivers it
+            queue_mail(
+                subject="Password Reset OTP",
+                message=f"Your OTP code for password reset is {otp_code}",
+                from_email="noreply@yourdomain.com",
+                recipient_list=[email],
+            )
 
         return Response({'message': 'OTP has been sent to your email'}, status=status.HTTP_200_OK)
     
@@ -171,21 +215,30 @@ class VerifyOTP(APIView):
         email = request.data.get('email')
         otp_code = request.data.get('otp_code')
 
+        max_attempts = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
         try:
-            user = User.objects.get(email=email)
-            otp_entry = OTP.objects.get(user=user, otp_code=otp_code)
+            # The user's unexpired OTP that still has attempts left, in one query
+            # joined on auth_user.email (indexed by migration 0052)
+            otp_entry = OTP.objects.get(
+                user__email=email, expires_at__gt=timezone.now(), attempts__lt=max_attempts
+            )
+        except (OTP.DoesNotExist, OTP.MultipleObjectsReturned):
+            return Response({'error': 'Invalid email or OTP'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if otp_entry.is_verified:
-                return Response({'error': 'OTP has already been used'}, status=status.HTTP_400_BAD_REQUEST)
+        if otp_entry.otp_code != otp_code:
+            # Count the failure; once max_attempts is reached the OTP stops matching
+            OTP.objects.filter(pk=otp_entry.pk).update(attempts=F('attempts') + 1)
+            return Response({'error': 'Invalid email or OTP'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Mark the OTP as verified
-            otp_entry.is_verified = True
-            otp_entry.save()
+        if otp_entry.is_verified:
+            return Response({'error': 'OTP has already been used'}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({'message': 'OTP verified successfully'}, status=status.HTTP_200_OK)
+        # Mark the OTP as verified
+        otp_entry.is_verified = True
+        otp_entry.save(update_fields=['is_verified'])
 
-        except (User.DoesNotExist, OTP.DoesNotExist):
-            return Response({'error': 'Invalid email or OTP'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'OTP verified successfully'}, status=status.HTTP_200_OK)
 
 class ResetPassword(APIView):
     permission_classes = [AllowAny]
@@ -196,13 +249,13 @@ class ResetPassword(APIView):
 
         try:
             user = User.objects.get(email=email)
-            otp_entry = OTP.objects.get(user=user)
+            otp_entry = OTP.objects.get(user=user, expires_at__gt=timezone.now())
 
             if not otp_entry.is_verified:
                 return Response({'error': 'OTP has not been verified'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Set the new password
-            user.set_password(new_password)
+            # Set the new password; saving the user evicts its cached tokens
+            user.password = hash_password(new_password)
             user.save()
 
             # Optionally delete the OTP entry after successful password reset
@@ -213,34 +266,65 @@ class ResetPassword(APIView):
         except (User.DoesNotExist, OTP.DoesNotExist):
             return Response({'error': 'Invalid request'}, status=status.HTTP_400_BAD_REQUEST)
 
+def etag_response(request, data, etag):
+    """
+    Respond with data tagged with etag, or 304 if If-None-Match lists it
+    (weak tags included, as for any GET) or is "*".
+    """
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in client_etags or etag in (tag.removeprefix('W/') for tag in client_etags):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag})
+
 # Fetch university data (public access)
 class UniversityList(APIView):
     permission_classes = [AllowAny]  # Public access allowed
 
     def get(self, request):
-        universities = University.objects.all()
-        serializer = UniversitySerializer(universities, many=True)
-        return Response(serializer.data)
+        catalog = get_catalog()
+        return etag_response(request, catalog.universities, catalog.etag('universities'))
 
 # Fetch campus data based on university (public access)
 class CampusList(APIView):
     permission_classes = [AllowAny]  # Public access allowed
 
-    def get(self, request):
-        campuses = Campus.objects.all()
-        serializer = CampusSerializer(campuses, many=True)
-        return Response(serializer.data)
+    def get(self, request, university_id=None):
+        catalog = get_catalog()
+        if university_id is None:
+            campuses = catalog.campuses
+        else:
+            campuses = catalog.campuses_by_university.get(university_id, [])
+        return etag_response(request, campuses, catalog.etag('campuses', university_id or ''))
 
 # Fetch course data based on campus (public access)
 class CourseList(APIView):
     permission_classes = [AllowAny]  # Public access allowed
 
-    def get(self, request):
-        courses = Course.objects.all()
-        serializer = CourseSerializer(courses, many=True)
-        return Response(serializer.data)
+    def get(self, request, campus_id=None):
+        catalog = get_catalog()
+        if campus_id is None:
+            courses = catalog.courses
+        else:
+            courses = catalog.courses_by_campus.get(campus_id, [])
+        return etag_response(request, courses, catalog.etag('courses', campus_id or ''))
+
+# Nested university -> campus -> course tree (public access)
+class CatalogView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, university_id=None):
+        catalog = get_catalog()
+        if university_id is None:
+            data = {'version': catalog.version, 'universities': catalog.tree}
+        else:
+            university = catalog.tree_by_university.get(university_id)
+            if university is None:
+                return Response({'error': 'University not found'}, status=status.HTTP_404_NOT_FOUND)
+            data = {'version': catalog.version, 'universities': [university]}
+        return etag_response(request, data, catalog.etag('catalog', university_id or ''))
+
 # Add materials (admin only)
-class AddMaterial(APIView):
+class AddMaterial(StreamingUploadMixin, APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
         serializer = MaterialSerializer(data=request.data)
@@ -265,13 +349,11 @@ class MaterialList(APIView):
 
         # Create a list to store the serialized materials with URLs
         materials_with_urls = []
+        media = get_media_url_builder(request)
         
         for material in materials:
-            # Check if material.file is not None
-            if material.file:
-                material.file_url = request.build_absolute_uri(material.file.url)
-            else:
-                material.file_url = None  # Handle cases where file is not present
+            # None if the material has no file
+            material.file_url = media.url(material.file)
 
             # Append the serialized data to the new list
             materials_with_urls.append({
@@ -336,13 +418,41 @@ class UserProfileView(APIView):
     def get(self, request, user_id):
         try:
             # Retrieve the user profile by user ID
-            profile = UserProfile.objects.get(user__id=user_id)
+            profile = UserProfile.objects.select_related('user', 'university', 'campus', 'course').get(user__id=user_id)
             serializer = UserProfileSerializer(profile)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except UserProfile.DoesNotExist:
             return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        
+
+class ProfileCardsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Compact profile cards for ?ids=1,2,3 (up to PROFILE_BATCH_MAX_IDS), in
+        the order asked for. Ids without a profile are left out.
+        """
+        raw_ids = [value for value in request.GET.get('ids', '').split(',') if value.strip()]
+        if not raw_ids:
+            return Response({'error': "Query parameter 'ids' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_ids = getattr(settings, 'PROFILE_BATCH_MAX_IDS', DEFAULT_PROFILE_BATCH_MAX_IDS)
+        if len(user_ids) > max_ids:
+            return Response({'error': f'At most {max_ids} ids can be requested at once.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cards = get_profile_cards(user_ids)
+        media = get_media_url_builder(request)
+        results = [
+            {**cards[user_id], 'profile_picture': media.url_for_name(cards[user_id]['profile_picture'])}
+            for user_id in user_ids if user_id in cards
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
 # Messaging
 class CreateMessageView(generics.CreateAPIView):
     queryset = Message.objects.all()
@@ -364,9 +474,19 @@ class CreateCommunityView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 class CommunityListView(generics.ListAPIView):
-    queryset = Community.objects.all()
     serializer_class = CommunitySerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = NewestFirstCursorPagination
+
+    def get_queryset(self):
+        """
+        Communities with their group and follower counts: counted per page in
+        the listing query, or read from the stored counters when
+        COMMUNITY_STORED_COUNTS is on (for communities too large to count).
+        """
+        if getattr(settings, 'COMMUNITY_STORED_COUNTS', False):
+            return Community.objects.all()
+        return annotate_community_counts(Community.objects.all())
 
 # Groups
 class CreateGroupView(generics.CreateAPIView):
@@ -374,20 +494,75 @@ class CreateGroupView(generics.CreateAPIView):
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+def annotate_group_listing(groups, user_id=None):
+    """
+    Select each group's admin and annotate num_followers (read by
+    Group.follower_count) and, for a user, is_following, so serializing a
+    page of groups takes no extra queries.
+    """
+    follower_counts = (UserGroup.objects.filter(group_id=OuterRef('pk')).order_by()
+                       .values('group_id').annotate(total=Count('*')).values('total'))
+    groups = groups.select_related('admin').annotate(num_followers=Coalesce(Subquery(follower_counts), 0))
+    if user_id:
+        groups = groups.annotate(is_following=Exists(UserGroup.objects.filter(group_id=OuterRef('pk'), user_id=user_id)))
+    return groups
+
+
 class GroupListView(generics.ListAPIView):
     serializer_class = GroupSerializer
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [permissions.AllowAny]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
         community_id = self.kwargs.get('community_id')
-        if community_id:
-            return Group.objects.filter(community_id=community_id)
-        return Group.objects.all()
+        groups = Group.objects.filter(community_id=community_id) if community_id else Group.objects.all()
+        # is_following is added for the signed-in user, or for ?user_id
+        user_id = self.request.user.id if self.request.user.is_authenticated else self.request.GET.get('user_id')
+        if user_id and not str(user_id).isdigit():
+            raise ValidationError({'error': 'user_id must be an id.'})
+        return annotate_group_listing(groups, user_id)
 
-    def get(self, request, *args, **kwargs):
-        groups = self.get_queryset()
-        serializer = self.get_serializer(groups, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class TrendingGroupsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Groups ranked by recent message and follow activity, optionally for
+        one ?university, paged with ?page (from 1) and ?page_size. Pages are
+        cached for TRENDING_CACHE_TTL seconds; the ranking itself only changes
+        when refresh_trending_groups runs.
+        """
+        university = request.GET.get('university', '')
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if university and not university.isdigit():
+            return Response({"error": "university must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = f'trending-groups:{university}:{page}:{page_size}'
+        data = cache.get(cache_key)
+        if data is None:
+            groups = Group.objects.filter(trend__isnull=False)
+            if university:
+                groups = groups.filter(trend__university_id=university)
+            groups = annotate_group_listing(groups).annotate(trend_score=F('trend__score')).order_by('-trend_score', '-id')
+            # One extra row tells whether there is a next page
+            rows = list(groups[(page - 1) * page_size:page * page_size + 1])
+            data = {
+                'has_next': len(rows) > page_size,
+                'results': TrendingGroupSerializer(rows[:page_size], many=True).data,
+            }
+            cache.set(cache_key, data, getattr(settings, 'TRENDING_CACHE_TTL', DEFAULT_TRENDING_CACHE_TTL))
+
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'page', page + 1) if data['has_next'] else None,
+            'previous': replace_query_param(request.build_absolute_uri(), 'page', page - 1) if page > 1 else None,
+            'results': data['results'],
+        })
 
 
 # User Group Management
@@ -416,6 +591,42 @@ class PromoteUserView(generics.UpdateAPIView):
     def perform_update(self, serializer):
         serializer.save(is_admin=True)
         
+def mark_group_read(user_id, group_id):
+    """Move the member's read pointer up to the group's latest message."""
+    return UserGroup.objects.filter(user_id=user_id, group_id=group_id).update(
+        read_seq=Subquery(Group.objects.filter(pk=group_id).values('message_seq')[:1])
+    )
+
+
+class FollowedGroupsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, user_id):
+        """
+        Groups the user follows, most recently active first, each with its
+        last message and the user's unread count. One joined query.
+        """
+        memberships = (
+            UserGroup.objects.filter(user_id=user_id)
+            .select_related('group', 'group__last_message')
+            .order_by(F('group__last_message_at').desc(nulls_last=True), '-group_id')
+        )
+        serializer = FollowedGroupSerializer(memberships, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MarkGroupReadView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request, group_id):
+        user_id = request.data.get('userID')
+        if not user_id:
+            return Response({'error': 'User ID is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not mark_group_read(user_id, group_id):
+            return Response({'error': 'You do not follow this group.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'unread_count': 0}, status=status.HTTP_200_OK)
+
+
 class MarkMessageAsReadView(generics.UpdateAPIView):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
@@ -426,6 +637,7 @@ class MarkMessageAsReadView(generics.UpdateAPIView):
         
 class SendMessageView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [GroupMessageRateThrottle]
 
     def post(self, request, group_id):
         group = get_object_or_404(Group, id=group_id)
@@ -433,7 +645,7 @@ class SendMessageView(APIView):
         # Ensure the user is a follower
         user_id = request.data.get('userID')
         user = get_object_or_404(User, id=user_id)
-        if user not in group.followers.all():
+        if not UserGroup.objects.filter(group=group, user=user).exists():
             return Response({'error': 'You must follow this group to send messages.'}, 
                             status=status.HTTP_403_FORBIDDEN)
 
@@ -446,8 +658,14 @@ class SendMessageView(APIView):
         if not username:
             return Response({'error': 'Username is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        message = Message(userID=user, group=group, content=content, username=username)
-        message.save()
+        with transaction.atomic():
+            message = Message(userID=user, group=group, content=content, username=username)
+            message.save()
+            # Posting means the sender has caught up with the group
+            mark_group_read(user.id, group.id)
+            queue_push(f'group:{group.id}', PushEvent.KIND_GROUP_MESSAGE, f'group:{group.id}',
+                       title=group.name, body=f'{username}: {content}',
+                       data={'group': group.id, 'message': message.id, 'sender': user.id})
 
         serializer = MessageSerializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -471,12 +689,14 @@ class FollowGroupView(APIView):
         # Get the group object using the group_id
         group = get_object_or_404(Group, id=group_id)
 
-        # Check if the user is already following the group
-        follow_exists = Follow.objects.filter(user=user, group=group).exists()
+        # Unfollow if the user is already a member, otherwise follow. Admin
+        # memberships carry the admin rights, so they are never toggled off here
+        membership = UserGroup.objects.filter(user=user, group=group).values_list('is_admin', flat=True).first()
+        if membership:
+            return Response({'error': 'Group admins cannot unfollow the group.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if follow_exists:
-            # If user is already following, unfollow the group
-            Follow.objects.filter(user=user, group=group).delete()  # Unfollow the group
+        if membership is not None:
+            UserGroup.objects.filter(user=user, group=group, is_admin=False).delete()
             return Response({
                 'message': 'You have unfollowed the group.',
                 'follower_count': group.followers.count(),
@@ -484,7 +704,7 @@ class FollowGroupView(APIView):
             }, status=status.HTTP_200_OK)
         else:
             # If user is not following, follow the group
-            Follow.objects.create(user=user, group=group)  # Follow the group
+            UserGroup.objects.get_or_create(user=user, group=group)  # Follow the group
             return Response({
                 'message': 'You are now following the group.',
                 'follower_count': group.followers.count(),
@@ -499,14 +719,7 @@ class LeadersView(APIView):
             # Filter leaders by university_id and campus_id
             leaders = Leaders.objects.filter(university_id=university_id, campus_id=campus_id)
             if leaders.exists():
-                leaders_data = [
-                    {
-                        "names": leader.names,
-                        "title": leader.title,
-                        "image": request.build_absolute_uri(leader.image.url) if leader.image else '',
-                    }
-                    for leader in leaders
-                ]
+                leaders_data = LeadersSerializer(leaders, many=True, context={'request': request}).data
                 return JsonResponse(leaders_data, safe=False, status=200)
             else:
                 return JsonResponse({"message": "No leaders found for the specified university and campus."}, status=404)
@@ -514,12 +727,44 @@ class LeadersView(APIView):
             return JsonResponse({"error": str(e)}, status=500)
 
 
-class ProductCreateView(APIView):
+def product_listing_response(request, products, view):
+    """
+    Cursor-paginated page of products, newest first. Sold products are left
+    out unless ?include_sold=true. ?min_price / ?max_price filter and
+    ?sort=price or -price sorts on the parsed numeric price.
+    """
+    if request.GET.get('include_sold', '').lower() not in ('1', 'true', 'yes'):
+        products = products.filter(is_sold=False)
+    bounds = {}
+    for param, lookup in (('min_price', 'price_amount__gte'), ('max_price', 'price_amount__lte')):
+        if not request.GET.get(param):
+            continue
+        try:
+            bounds[lookup] = Decimal(request.GET[param])
+        except InvalidOperation:
+            bounds[lookup] = None
+        # NaN and Infinity parse as Decimals but can't be compared in SQL
+        if bounds[lookup] is None or not bounds[lookup].is_finite():
+            return Response({"error": "min_price and max_price must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    products = products.filter(**bounds)
+    paginator = NewestFirstCursorPagination()
+    sort = request.GET.get('sort')
+    if sort in ('price', '-price'):
+        # Products without a parseable price can't take part in a price sort
+        products = products.filter(price_amount__isnull=False)
+        paginator.ordering = (sort.replace('price', 'price_amount'), sort.replace('price', 'id'))
+    page = paginator.paginate_queryset(products.select_related('user'), request, view=view)
+    serializer = ProductSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+class ProductCreateView(StreamingUploadMixin, APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        # Create a mutable copy of request data
-        data = request.data.copy()
+        # Shallow, mutable view of the request data; QueryDict.copy() would
+        # deep-copy every uploaded file
+        data = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
 
         # Associate user if provided in the request
         user_id = data.get('user')
@@ -530,52 +775,56 @@ class ProductCreateView(APIView):
         else:
             return Response({"error": "User is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Handle images separately
-        images = {
-            'image1': request.FILES.get('image1'),
-            'image2': request.FILES.get('image2'),
-            'image3': request.FILES.get('image3'),
-            'image4': request.FILES.get('image4'),
-        }
-
-        # Add images to the data dictionary if they exist
-        for key, file in images.items():
-            if file:
-                data[key] = file
-
-        # Print the received data for debugging
-        print("Received data:", data)
+        # Uploaded images go straight into the single INSERT; the image
+        # fields are read-only on the serializer
+        images = {key: request.FILES[key] for key in Product.IMAGE_FIELDS if key in request.FILES}
 
         # Serialize data and include the request in the context
         serializer = ProductSerializer(data=data, context={'request': request})  # Pass request to context
         if serializer.is_valid():
-            # Save the validated data
-            product = serializer.save()
-
-            # Check if images are uploaded and associate them with the product instance
-            for key, file in images.items():
-                if file:
-                    # Assuming that you are using a FileField in your Product model for image fields
-                    setattr(product, key, file)
-                    product.save()  # Save the image field to the product
-
+            try:
+                serializer.save(**images)
+            except IntegrityError:
+                return Response({"error": "Product could not be saved."}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            # Log errors for debugging
-            print(serializer.errors)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        
     def get(self, request, *args, **kwargs):
         product_type = request.GET.get('type')  # Retrieve the 'type' query parameter
         products = Product.objects.all()
         if product_type:
             products = products.filter(material_type=product_type)
 
-        # Pass request to serializer context
-        serializer = ProductSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        return product_listing_response(request, products, view=self)
+
+class ProductSearchView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Ranked search over unsold products' titles and features, paged with
+        ?page (from 1) and ?page_size.
+        """
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One extra id tells whether there is a next page
+        ids = get_search_backend().search(query, (page - 1) * page_size, page_size + 1)
+        products = Product.objects.select_related('user').in_bulk(ids[:page_size])
+        serializer = ProductSerializer(
+            [products[pk] for pk in ids[:page_size] if pk in products], many=True, context={'request': request}
+        )
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'page', page + 1) if len(ids) > page_size else None,
+            'previous': replace_query_param(request.build_absolute_uri(), 'page', page - 1) if page > 1 else None,
+            'results': serializer.data,
+        })
 
 class ProductListByCategoryView(APIView):
     permission_classes = [AllowAny]
@@ -591,8 +840,7 @@ class ProductListByCategoryView(APIView):
 
         # Filter products by the validated category
         products = Product.objects.filter(material_type=category)
-        serializer = ProductSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        return product_listing_response(request, products, view=self)
         
 class ProductMarkAsSoldView(APIView):
     def post(self, request, pk):
@@ -706,6 +954,7 @@ class ProductDeleteView(APIView):
 
 class SendDirectMessageView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [DirectMessageRateThrottle]
 
     def post(self, request, user_id):
         """
@@ -776,12 +1025,16 @@ class SendDirectMessageView(APIView):
             )
 
         # Create and save the message
-        message = PersonalMessage(
-            sender=sender, 
-            recipient=recipient_user, 
-            content=content
-        )
-        message.save()
+        with transaction.atomic():
+            message = PersonalMessage(
+                sender=sender, 
+                recipient=recipient_user, 
+                content=content
+            )
+            message.save()
+            queue_push(f'user:{recipient_user.id}', PushEvent.KIND_DIRECT_MESSAGE, f'dm:{sender.id}',
+                       title=sender.username, body=content,
+                       data={'sender': sender.id, 'message': message.id})
 
         serializer = PersonalMessageSerializer(message)
         return Response(
@@ -1019,24 +1272,79 @@ class DeleteMessageView(APIView):
         return Response({'message': 'Message deleted successfully.'}, status=status.HTTP_200_OK)
     
 class NotificationList(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [AllowAny]
-    
+
     def get(self, request):
-        notification = Notification.objects.all()
-        serializer = NotificationSerializer(notification, many=True)
-        return Response(serializer.data)
-    
+        """
+        The caller's inbox, newest first and cursor-paginated: their direct
+        notifications plus broadcasts to everyone, their university and their
+        campus. Anonymous callers only see broadcasts to everyone.
+        """
+        paginator = NewestFirstCursorPagination()
+        page = paginator.paginate_queryset(inbox_queryset(request.user), request, view=self)
+        serializer = NotificationSerializer(page, many=True, context={'read_ids': read_ids(request.user, page)})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class NotificationUnreadCountView(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
 
-class UserListView(View):
     def get(self, request):
-        # Debug the query
-        profiles = User.objects.all().values('id', 'username')
-        print(f"Fetched Profiles: {list(profiles)}")
-        
-        # Return the response as JSON
-        return JsonResponse(list(profiles), safe=False, status=200)
+        return Response({'unread': unread_count(request.user)}, status=status.HTTP_200_OK)
+
+
+class NotificationMarkReadView(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        notification = inbox_queryset(request.user).filter(pk=pk).first()
+        if notification is None:
+            return Response({'error': 'Notification not found.'}, status=status.HTTP_404_NOT_FOUND)
+        mark_read(request.user, notification)
+        return Response({'unread': unread_count(request.user)}, status=status.HTTP_200_OK)
+
+
+class NotificationMarkAllReadView(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
 
-class UserProfileUpdateView(APIView):
+    def post(self, request):
+        mark_all_read(request.user)
+        return Response({'unread': 0}, status=status.HTTP_200_OK)
+
+
+class UserListView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Page through users in username order. ?q matches usernames by prefix,
+        or anywhere with ?match=contains; ?university, ?campus and ?course
+        filter by the ids on the user's profile.
+        """
+        users = User.objects.all()
+        query = request.GET.get('q', '').strip()
+        if query:
+            if request.GET.get('match') == 'contains':
+                users = users.filter(username__icontains=query)
+            else:
+                # A prefix LIKE can range-scan the unique username index
+                users = users.filter(username__istartswith=query)
+        for param in ('university', 'campus', 'course'):
+            value = request.GET.get(param)
+            if value:
+                if not value.isdigit():
+                    return Response({"error": f"{param} must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+                users = users.filter(**{f'userprofile__{param}_id': value})
+
+        paginator = UsernameCursorPagination()
+        page = paginator.paginate_queryset(users.values('id', 'username'), request, view=self)
+        return paginator.get_paginated_response(page)
+
+class UserProfileUpdateView(StreamingUploadMixin, APIView):
     permission_classes = [AllowAny]  # No authentication required
     
     def get_object(self, user_id):
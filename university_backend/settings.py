@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.uploads.UploadSizeLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -107,6 +108,21 @@ DATABASES = {
     }
 }
 
+# Password hashing runs on a bounded thread pool (api.passwords); requests
+# over the admission cap, or queued longer than the timeout, get a 503.
+# The cap only spans processes when it lives in a shared cache: with
+# one-request-per-process workers (uWSGI on PythonAnywhere) set
+# PASSWORD_HASHING_SHARED_CACHE to a CACHES alias every worker reaches, e.g. a
+# DatabaseCache, and keep PASSWORD_HASHING_MAX_CONCURRENT below the worker
+# count so a login storm always leaves workers for other requests. Without
+# one, each process allows WORKERS + QUEUE, which only helps threaded workers.
+PASSWORD_HASHING_WORKERS = 4
+PASSWORD_HASHING_QUEUE = 16
+PASSWORD_HASHING_QUEUE_TIMEOUT = 2.0  # seconds
+PASSWORD_HASHING_SHARED_CACHE = None
+PASSWORD_HASHING_MAX_CONCURRENT = 2  # hashes at once across all workers, with a shared cache
+PASSWORD_HASHING_SLOT_LEASE = 30  # seconds before a slot held by a dead worker frees itself
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -149,6 +165,21 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# CachedTokenAuthentication: validated tokens are kept in the named CACHES
+# alias when TOKEN_AUTH_SHARED_CACHE is set, else in the default cache if all
+# workers share it. Otherwise each worker keeps its own LRU, and since a
+# logout can't evict other workers' copies those expire much sooner.
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 60  # seconds
+TOKEN_AUTH_LOCAL_CACHE_TTL = 5  # seconds, bounds how long a logged-out token works elsewhere
+TOKEN_AUTH_SHARED_CACHE = None
+
+# Compact profile cards served by user-profiles/, cached per user in this
+# CACHES alias and dropped whenever the profile is saved.
+PROFILE_CARD_CACHE = 'default'
+PROFILE_CARD_CACHE_TTL = 30  # seconds
+PROFILE_BATCH_MAX_IDS = 100
+
 REST_FRAMEWORK = {
     # 'DEFAULT_AUTHENTICATION_CLASSES': [
     #     'rest_framework.authentication.TokenAuthentication',
@@ -156,13 +187,45 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # PythonAnywhere's front-end proxy appends the real client address to
+    # X-Forwarded-For; only that last entry is trusted for per-IP throttling
+    'NUM_PROXIES': 1,
+    # Token bucket sizes for api.throttling; each refills at the same rate.
+    # Per-IP buckets are sized for a campus sharing one NAT address; the
+    # *_account buckets limit each email address on its own.
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '60/min',
+        'login_account': '10/min',
+        'register': '30/min',
+        'register_account': '5/min',
+        'password_reset': '30/min',
+        'password_reset_account': '5/min',
+        'direct_message': '60/min',
+        'group_message': '60/min',
+    },
 }
 
+# Rate limit buckets live in process memory unless this names a CACHES alias
+RATE_LIMIT_SHARED_CACHE = None
+RATE_LIMIT_LOCAL_SIZE = 100000
+
 
 # settings.py
 MEDIA_URL = '/materials/'
 MEDIA_ROOT = BASE_DIR / 'materials'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'materials')
+# Absolute base for media links in API payloads (e.g. a CDN host). When unset
+# it is derived from the request host and MEDIA_URL.
+MEDIA_BASE_URL = None
+
+# Uploads always stream to temporary files instead of being held in memory.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+MAX_UPLOAD_BODY_SIZE = 40 * 1024 * 1024  # Whole request, checked before reading
+MAX_UPLOAD_FILE_SIZE = 10 * 1024 * 1024  # Per file on the API upload views
+UPLOAD_ALLOWED_CONTENT_TYPES = [
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic',
+    'application/pdf',
+]
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -194,6 +257,50 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'salumrashidjr@gmail.com'
 EMAIL_HOST_PASSWORD = 'mbpn uzdt sbbm ctqm'
 
+# Password reset OTPs
+OTP_TTL_SECONDS = 600
+OTP_MAX_ATTEMPTS = 5  # Wrong codes allowed before the OTP stops verifying
+
+# Currency assumed for product prices that don't name one
+PRODUCT_DEFAULT_CURRENCY = 'TZS'
+
+# 'auto' uses MySQL FULLTEXT / SQLite FTS5 when available, 'python' forces the
+# in-process inverted index, which is meant for development and tests
+PRODUCT_SEARCH_BACKEND = 'auto'
+PRODUCT_SEARCH_INDEX_TTL = 60  # seconds before the in-process index is rebuilt regardless
+
+# Outbox worker (python manage.py send_queued_email --loop)
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 300  # seconds a claimed batch waits before another worker retries it
+EMAIL_OUTBOX_SENT_RETENTION_HOURS = 24  # sent mail is purged after this
+
+# Push worker (python manage.py send_queued_pushes --loop). PUSH_TRANSPORT is
+# the dotted path of an api.push.BasePushTransport subclass; the loopback one
+# only records messages, optionally as JSON lines in PUSH_LOOPBACK_FILE.
+PUSH_TRANSPORT = 'api.push.LoopbackPushTransport'
+PUSH_LOOPBACK_FILE = None
+PUSH_BATCH_SIZE = 500
+PUSH_MAX_ATTEMPTS = 5
+PUSH_RETRY_DELAY = 10  # seconds, doubled after every failed attempt
+PUSH_CLAIM_TIMEOUT = 300  # seconds a claimed batch waits before another worker retries it
+PUSH_SENT_RETENTION_HOURS = 24  # sent pushes are purged after this
+
+# Trending groups (python manage.py refresh_trending_groups --loop). Hourly
+# message/follow counts from the last TRENDING_WINDOW_HOURS are summed with
+# weights that halve every TRENDING_HALF_LIFE_HOURS.
+TRENDING_WINDOW_HOURS = 72
+TRENDING_HALF_LIFE_HOURS = 12
+TRENDING_MESSAGE_WEIGHT = 1.0
+TRENDING_FOLLOW_WEIGHT = 3.0
+TRENDING_CACHE_TTL = 60  # seconds a groups/trending/ page is served from cache
+
+# communities/ counts groups and followers per page by default; turn this on
+# to serve the counters stored on Community instead (python manage.py
+# recount_communities resets them).
+COMMUNITY_STORED_COUNTS = False
+
 
 # LOGGING = {
 #     'version': 1,